@@ -1,57 +1,34 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
-from pydantic import BaseModel
-from typing import Dict, List, Optional
-from enum import Enum
+from fastapi.responses import StreamingResponse, Response
+from typing import Dict, List, Optional, Tuple
 from app.api.models.document import (
-    DocumentRequest, RefinementRequest, DocumentResponse,
-    ExportRequest, DocumentType, ToneType
+    DocumentRequest, RefinementRequest, ExportRequest,
+    BatchDocumentRequest, BulkExportRequest, RefinementMode
 )
-from app.api.services.export_service import DocumentExporter
+from app.api.services.admission import AdmissionRejected, AdmissionSlot, create_admission_controller
+from app.api.services.export_service import DocumentExporter, MIME_TYPES, content_disposition
 from app.api.services.llm_service import LLMService
+from app.api.services.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, SSE_FIRST_CHUNK_SECONDS, MetricsMiddleware, register_cache_metrics
+)
+from app.api.services.prompt_templates import create_template_registry
+from app.api.services.render_pool import RenderPool
+from app.api.services.resilience import UpstreamError
+from app.api.services.session_store import create_session_store
+from app.api.services.tracing import RequestTracingMiddleware
+import ipaddress
 import os
 from datetime import datetime
 import logging
 import json
 import asyncio
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Models
-class DocumentType(str, Enum):
-    ANNOUNCEMENT = "Announcement"
-    STUDENT_COMMUNICATION = "Student Communication"
-    MEETING_SUMMARY = "Meeting Summary"
-
-class ToneType(str, Enum):
-    NEUTRAL = "Neutral"
-    FRIENDLY = "Friendly"
-    FIRM = "Firm but polite"
-    FORMAL = "Formal"
-
-class DocumentRequest(BaseModel):
-    prompt: str
-    doc_type: DocumentType
-    tone: ToneType
-    additional_context: Optional[str] = None
-    sender_name: Optional[str] = None
-    sender_profession: Optional[str] = None
-    language: Optional[str] = None
-
-class RefinementRequest(BaseModel):
-    refinement_prompt: str
-    current_document: str
-    doc_type: DocumentType
-    tone: ToneType
-
-class DocumentResponse(BaseModel):
-    document: str
-    metadata: Dict[str, str]
-    history: Optional[List[Dict[str, str]]] = None
-
 # Initialize FastAPI
 app = FastAPI(title="TUM Admin Assistant")
 
@@ -63,16 +40,35 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Outermost, so every span of a request (metrics included) carries its ID
+app.add_middleware(RequestTracingMiddleware)
 
-# Initialize services
+# Initialize services. The exporter, session store and prompt templates are
+# cheap to build; the LLM service is created on first use so export-only
+# workers start fast and never load the Gemini client library or need
+# GOOGLE_API_KEY. Templates are still validated here so a broken template
+# directory fails at startup rather than on the first generate request.
 try:
-    llm_service = LLMService()
+    prompt_templates = create_template_registry()
     document_exporter = DocumentExporter()
+    render_pool = RenderPool(document_exporter)
+    session_store = create_session_store()
+    admission = create_admission_controller()
     logger.info("Successfully initialized services")
 except Exception as e:
     logger.error(f"Error initializing services: {str(e)}")
     raise
 
+_llm_service: Optional[LLMService] = None
+
+def get_llm_service() -> LLMService:
+    """Return the LLM service, creating it on first use."""
+    global _llm_service
+    if _llm_service is None:
+        _llm_service = LLMService(prompt_templates)
+    return _llm_service
+
 # Test Data
 def get_test_response(doc_type: str, tone: str) -> str:
     responses = {
@@ -96,13 +92,112 @@ TUM Administration""",
     }
     return responses.get(doc_type, "Test document content")
 
+# Session helpers
+async def resolve_refinement_context(request: RefinementRequest):
+    """Return the document to refine and its history window for a refinement request."""
+    window = session_store.history_window
+    if request.session_id and (request.version_id or request.current_document is None):
+        # The requested version, or the latest one
+        version = await session_store.get_version(request.session_id, request.version_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Session or document version not found")
+        return version["document"], await session_store.get_history(request.session_id, version["version_id"])
+    if request.current_document is None:
+        raise HTTPException(status_code=422, detail="Provide session_id or current_document")
+    if request.session_id:
+        # Seed the session with the inline document so later turns can reference it
+        if await session_store.get_session(request.session_id) is None:
+            raise HTTPException(status_code=404, detail="Session not found or expired")
+        # A fresh session (e.g. one replacing an expired session) has no
+        # versions yet, so the client's inline history is used instead
+        history = await session_store.get_history(request.session_id) or (request.history or [])[-window:]
+        await session_store.add_version(
+            request.session_id,
+            request.current_document,
+            {"doc_type": request.doc_type.value, "tone": request.tone.value}
+        )
+        return request.current_document, history
+    return request.current_document, (request.history or [])[-window:]
+
+async def record_chunk(chunk: Dict, session_id: str, parts: List[str]) -> Dict:
+    """Collect streamed text and store it as a new version once the stream completes."""
+    parts.append(chunk["document"])
+    if chunk["metadata"].get("is_complete"):
+        version = await session_store.add_version(session_id, "".join(parts), chunk["metadata"])
+        if version is not None:
+            chunk = {**chunk, "version_id": version["version_id"]}
+    return chunk
+
+async def time_first_event(events, endpoint: str, start: float):
+    """Pass SSE events through, recording how long the first one took since the request arrived."""
+    first = True
+    async for event in events:
+        if first:
+            SSE_FIRST_CHUNK_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+            first = False
+        yield event
+
+# Admission control. Clients are rate limited by peer address; the client
+# header is only honoured from RATE_LIMIT_TRUSTED_PROXIES (comma-separated
+# addresses or networks), which key each of their end users separately.
+# The default trusts loopback, where the Streamlit frontend runs alongside
+# the backend; set it to an empty value to always limit by address.
+CLIENT_KEY_HEADER = os.getenv("RATE_LIMIT_CLIENT_HEADER", "X-Client-ID")
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(value.strip(), strict=False)
+    for value in os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "127.0.0.1,::1").split(",")
+    if value.strip()
+]
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+def client_key(http_request: Request) -> str:
+    """Identify the caller for rate limiting: the peer address, or a trusted proxy's client header."""
+    host = http_request.client.host if http_request.client else "unknown"
+    key = http_request.headers.get(CLIENT_KEY_HEADER) if CLIENT_KEY_HEADER else None
+    if key and is_trusted_proxy(host):
+        return f"key:{key[:128]}"
+    return f"ip:{host}"
+
+def too_many_requests(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, round(e.retry_after)))}
+    )
+
+async def admit(http_request: Request, route: str) -> AdmissionSlot:
+    """Take an LLM admission slot for this request, or fail fast with 429."""
+    try:
+        return await admission.acquire(client_key(http_request), route)
+    except AdmissionRejected as e:
+        raise too_many_requests(e)
+
+def queue_wait_header(slot: AdmissionSlot) -> Dict[str, str]:
+    return {"X-Queue-Wait-Ms": f"{slot.queue_wait * 1000:.1f}"}
+
+def upstream_unavailable(e: UpstreamError) -> HTTPException:
+    """Report a failed or rejected Gemini call as 503/504 so clients can back off and retry."""
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, round(e.retry_after)))}
+    )
+
 # Routes
 @app.post("/api/documents/generate")
-async def generate_document(request: DocumentRequest):
+async def generate_document(request: DocumentRequest, http_request: Request, response: Response):
     """Generate a document based on the request parameters."""
+    slot = await admit(http_request, "generate")
+    response.headers.update(queue_wait_header(slot))
     try:
         logger.info(f"Generating document of type {request.doc_type} with tone {request.tone}")
-        result = llm_service.generate_document(
+        result = await get_llm_service().generate_document_async(
             request.doc_type,
             request.tone,
             request.prompt,
@@ -111,46 +206,275 @@ async def generate_document(request: DocumentRequest):
             request.sender_profession,
             request.language
         )
+        if request.session_id:
+            version = await session_store.add_version(request.session_id, result["document"], result["metadata"])
+            if version is not None:
+                result["version_id"] = version["version_id"]
         return result
+    except UpstreamError as e:
+        slot.refund()
+        logger.error(f"Error generating document: {str(e)}")
+        raise upstream_unavailable(e)
+    except Exception as e:
+        slot.refund()
+        logger.error(f"Error generating document: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        slot.release()
+
+@app.post("/api/documents/generate/stream")
+async def generate_document_stream(request: DocumentRequest, http_request: Request):
+    """Generate a document and stream it as server-sent events."""
+    start = time.perf_counter()
+    slot = await admit(http_request, "generate_stream")
+    try:
+        logger.info(f"Streaming document of type {request.doc_type} with tone {request.tone}")
+        get_llm_service().check_available()
+        parts = []
+
+        async def generate():
+            async for chunk in get_llm_service().generate_document_stream(
+                request.doc_type,
+                request.tone,
+                request.prompt,
+                request.additional_context,
+                request.sender_name,
+                request.sender_profession,
+                request.language
+            ):
+                if request.session_id:
+                    chunk = await record_chunk(chunk, request.session_id, parts)
+                yield f"data: {json.dumps(chunk)}\n\n"
+
+        return StreamingResponse(
+            slot.hold(time_first_event(generate(), "generate_stream", start)),
+            media_type="text/event-stream",
+            headers=queue_wait_header(slot)
+        )
+    except UpstreamError as e:
+        slot.release()
+        slot.refund()
+        logger.error(f"Error generating document: {str(e)}")
+        raise upstream_unavailable(e)
     except Exception as e:
+        slot.release()
+        slot.refund()
         logger.error(f"Error generating document: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/documents/generate/batch")
+async def generate_documents_batch(request: BatchDocumentRequest, http_request: Request):
+    """Generate several documents concurrently and stream each result as server-sent events.
+
+    The batch is charged one rate-limit token per item up front, and each
+    item takes its own admission slot while it runs, so a batch never uses
+    more capacity than the same requests sent one by one. Items that are
+    rejected or fail are refunded.
+    """
+    start = time.perf_counter()
+    logger.info(f"Generating batch of {len(request.requests)} documents")
+    limiter = admission.rate_limiter
+    if limiter is not None and len(request.requests) > limiter.burst:
+        raise HTTPException(
+            status_code=422,
+            detail=f"A batch may hold at most {int(limiter.burst)} documents"
+        )
+    try:
+        llm_service = get_llm_service()
+        llm_service.check_available()
+    except UpstreamError as e:
+        logger.error(f"Error generating batch: {str(e)}")
+        raise upstream_unavailable(e)
+    except Exception as e:
+        logger.error(f"Error generating batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    client = client_key(http_request)
+    try:
+        admission.charge(client, "generate_batch", cost=len(request.requests))
+    except AdmissionRejected as e:
+        raise too_many_requests(e)
+    items = [
+        {
+            "doc_type": item.doc_type,
+            "tone": item.tone,
+            "prompt": item.prompt,
+            "additional_context": item.additional_context,
+            "sender_name": item.sender_name,
+            "sender_profession": item.sender_profession,
+            "language": item.language
+        }
+        for item in request.requests
+    ]
+
+    async def generate():
+        succeeded = 0
+        async for result in llm_service.generate_documents_batch(
+            items,
+            request.max_parallel,
+            request.item_timeout,
+            acquire_slot=lambda: admission.acquire_slot("generate_batch")
+        ):
+            if result["status"] == "ok":
+                succeeded += 1
+            else:
+                admission.refund(client)
+            yield f"data: {json.dumps(result)}\n\n"
+        summary = {"is_complete": True, "total": len(items), "succeeded": succeeded}
+        yield f"data: {json.dumps(summary)}\n\n"
+
+    return StreamingResponse(
+        time_first_event(generate(), "generate_batch", start),
+        media_type="text/event-stream"
+    )
+
 @app.post("/api/documents/refine")
-async def refine_document(request: RefinementRequest):
-    """Refine a document based on the refinement request."""
+async def refine_document(request: RefinementRequest, http_request: Request):
+    """Refine a document based on the refinement request.
+
+    With ``session_id`` the document (``version_id`` or the latest version)
+    and its history window are loaded server-side, and the refined text is
+    stored as a new version whose ID is sent with the final chunk.
+    """
+    start = time.perf_counter()
+    # Admit before touching the session, so a rejected request stores nothing
+    slot = await admit(http_request, "refine")
     try:
         logger.info(f"Refining document of type {request.doc_type} with tone {request.tone}")
-        
+        get_llm_service().check_available()
+        current_document, history = await resolve_refinement_context(request)
+        parts = []
+        refine = get_llm_service().refine_document_patch if request.mode == RefinementMode.PATCH else get_llm_service().refine_document
+
         async def generate():
-            async for chunk in llm_service.refine_document(
-                request.current_document,
+            async for chunk in refine(
+                current_document,
                 request.refinement_prompt,
                 request.doc_type,
-                request.tone
+                request.tone,
+                history
             ):
+                if request.session_id:
+                    chunk = await record_chunk(chunk, request.session_id, parts)
                 yield f"data: {json.dumps(chunk)}\n\n"
         
         return StreamingResponse(
-            generate(),
-            media_type="text/event-stream"
+            slot.hold(time_first_event(generate(), "refine", start)),
+            media_type="text/event-stream",
+            headers=queue_wait_header(slot)
         )
+    except HTTPException:
+        slot.release()
+        slot.refund()
+        raise
+    except UpstreamError as e:
+        slot.release()
+        slot.refund()
+        logger.error(f"Error refining document: {str(e)}")
+        raise upstream_unavailable(e)
     except Exception as e:
+        slot.release()
+        slot.refund()
         logger.error(f"Error refining document: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/sessions")
+async def create_session():
+    """Create a conversation session for server-side document versions."""
+    return {"session_id": await session_store.create_session()}
+
+@app.get("/api/sessions/{session_id}")
+async def get_session(session_id: str):
+    """List the document versions stored for a session."""
+    session = await session_store.get_session(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {
+        "session_id": session_id,
+        "versions": [
+            {"version_id": v["version_id"], "metadata": v["metadata"], "created_at": v["created_at"]}
+            for v in session["versions"]
+        ]
+    }
+
 @app.post("/api/documents/export")
 async def export_document(request: ExportRequest):
     """Export a document in the specified format."""
     try:
         logger.info(f"Exporting document in {request.format} format")
-        result = document_exporter.export_document(request.document_content, request.metadata, request.format)
-        return FileResponse(result, filename=os.path.basename(result))
+        format = request.format.value
+        # Named before rendering, so a bad name cannot fail a finished render
+        filename = document_exporter.download_filename(request.metadata, format)
+        data = await render_pool.render(request.document_content, request.metadata, format)
+        return Response(
+            content=data,
+            media_type=MIME_TYPES[format],
+            headers={"Content-Disposition": content_disposition(filename)}
+        )
     except Exception as e:
         logger.error(f"Error exporting document: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/documents/export/bulk")
+async def export_documents_bulk(request: BulkExportRequest):
+    """Export many documents in several formats as a streamed ZIP archive."""
+    logger.info(f"Bulk exporting {len(request.documents)} documents as {[f.value for f in request.formats]}")
+    documents = [(item.document_content, item.metadata) for item in request.documents]
+    formats = [f.value for f in request.formats]
+    filename = f"TUM_documents_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return StreamingResponse(
+        document_exporter.export_zip_stream(documents, formats, render=render_pool.render),
+        media_type="application/zip",
+        headers={"Content-Disposition": content_disposition(filename)}
+    )
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Report hit/miss counters for the response caches."""
+    return {
+        "llm": await _llm_service.cache_stats() if _llm_service else {"backend": "not initialized"},
+        "prompt_prefix": _llm_service.prefix_cache_stats() if _llm_service else {},
+        "export": document_exporter.render_cache.stats()
+    }
+
+@app.get("/api/exports/stats")
+async def export_stats():
+    """Report export render pool queue depth and render times."""
+    return render_pool.stats()
+
+@app.get("/api/admission/stats")
+async def admission_stats():
+    """Report LLM admission slots, queue depth, queue wait times and rejections."""
+    return admission.stats()
+
+def cache_counters() -> Dict[str, Tuple[int, int]]:
+    """Hit and miss counts of the caches, read by /metrics at scrape time."""
+    render_cache = document_exporter.render_cache
+    counters = {"export_render": (render_cache.hits, render_cache.misses)}
+    if _llm_service is not None:
+        if _llm_service.response_cache is not None:
+            counters["llm_response"] = (_llm_service.response_cache.hits, _llm_service.response_cache.misses)
+        diff_cache = _llm_service.history_budget.diff_cache
+        counters["history_diff"] = (diff_cache.hits, diff_cache.misses)
+        prefix = _llm_service.prefix_usage
+        counters["prompt_prefix"] = (prefix["cache_hits"], prefix["requests"] - prefix["cache_hits"])
+    return counters
+
+register_cache_metrics(cache_counters)
+
+@app.get("/metrics")
+async def metrics():
+    """Expose latency histograms, in-flight gauges, cache and error counters for Prometheus."""
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.on_event("shutdown")
+def shutdown_render_pool():
+    """Stop export worker processes with the server."""
+    render_pool.shutdown()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy"} 
\ No newline at end of file
+    health = {"status": "healthy"}
+    if _llm_service is not None:
+        health["llm"] = _llm_service.resilience.stats()
+    return health 
\ No newline at end of file
@@ -1,6 +1,13 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import Dict, List, Optional
 from enum import Enum
+import os
+
+# Upper bounds on list sizes accepted in a single request. Bulk exports are
+# streamed with a bounded render window, so their cap only limits the size
+# of the request body and can be raised through BULK_EXPORT_MAX_DOCUMENTS.
+MAX_BATCH_DOCUMENTS = 10
+MAX_BULK_EXPORT_DOCUMENTS = int(os.getenv("BULK_EXPORT_MAX_DOCUMENTS", "1000"))
 
 class DocumentType(str, Enum):
     """
@@ -39,6 +46,17 @@ class ExportFormat(str, Enum):
     DOCX = "docx"
     TXT = "txt"
 
+class RefinementMode(str, Enum):
+    """
+    RefinementMode represents how a refinement is produced.
+
+    Args:
+        str (Enum): The string representation of the refinement mode.
+        Enum: The enum type for the refinement mode.
+    """
+    REWRITE = "rewrite"
+    PATCH = "patch"
+
 class DocumentRequest(BaseModel):
     """
     DocumentRequest represents the request for generating a professional email document.
@@ -50,6 +68,7 @@ class DocumentRequest(BaseModel):
         sender_name (Optional[str]): The name of the sender.
         sender_profession (Optional[str]): The profession of the sender.
         language (Optional[str]): The language of the email.
+        session_id (Optional[str]): The session to store the generated document in as a new version.
     """
     prompt: str
     doc_type: DocumentType
@@ -58,15 +77,49 @@ class DocumentRequest(BaseModel):
     sender_name: Optional[str] = None
     sender_profession: Optional[str] = None
     language: Optional[str] = 'English'
+    session_id: Optional[str] = None
+
+class BatchDocumentRequest(BaseModel):
+    """
+    BatchDocumentRequest represents a request for generating several documents at once.
+
+    Args:
+        requests (List[DocumentRequest]): The documents to generate, at most MAX_BATCH_DOCUMENTS.
+        max_parallel (Optional[int]): How many documents to generate concurrently; capped by the server.
+        item_timeout (Optional[float]): Seconds allowed per document; capped by the server.
+    """
+    requests: List[DocumentRequest] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_DOCUMENTS, description="The documents to generate"
+    )
+    max_parallel: Optional[int] = Field(None, ge=1, description="Concurrent generations for this batch")
+    item_timeout: Optional[float] = Field(None, gt=0, description="Timeout per document in seconds")
 
 class RefinementRequest(BaseModel):
     """
     RefinementRequest represents the request for refining a document.
 
+    The document to refine is either stored in a session (``session_id``,
+    optionally with ``version_id``; the latest version otherwise) or sent
+    inline as ``current_document``.
+
     Args:
         refinement_prompt (str): The instructions for refining the document.
+        doc_type (DocumentType): The type of document being refined.
+        tone (ToneType): The tone of the document being refined.
+        session_id (Optional[str]): The session holding the document versions.
+        version_id (Optional[str]): The stored version to refine.
+        current_document (Optional[str]): The document to refine, when not taken from a session.
+        history (Optional[List[str]]): Earlier versions, when no session is used.
+        mode (RefinementMode): Rewrite the document, or ask for an edit list and patch it server-side.
     """
-    refinement_prompt: str = Field(..., min_length=10, description="The refinement instructions")
+    refinement_prompt: str = Field(..., min_length=1, description="The refinement instructions")
+    doc_type: DocumentType
+    tone: ToneType
+    session_id: Optional[str] = None
+    version_id: Optional[str] = None
+    current_document: Optional[str] = None
+    history: Optional[List[str]] = None
+    mode: RefinementMode = RefinementMode.REWRITE
 
 class ExportRequest(BaseModel):
     """
@@ -81,6 +134,40 @@ class ExportRequest(BaseModel):
     document_content: str = Field(..., description="The document content to export")
     metadata: Dict[str, str] = Field(..., description="Document metadata")
 
+class BulkExportItem(BaseModel):
+    """
+    BulkExportItem represents a single document within a bulk export.
+
+    Args:
+        document_content (str): The content of the document to be exported.
+        metadata (Dict[str, str]): The metadata associated with the document.
+    """
+    document_content: str = Field(..., description="The document content to export")
+    metadata: Dict[str, str] = Field(default_factory=dict, description="Document metadata")
+
+class BulkExportRequest(BaseModel):
+    """
+    BulkExportRequest represents the request for exporting many documents as one ZIP archive.
+
+    Args:
+        documents (List[BulkExportItem]): The documents to export, at most MAX_BULK_EXPORT_DOCUMENTS.
+        formats (List[ExportFormat]): The formats each document is exported in; repeats are dropped.
+    """
+    documents: List[BulkExportItem] = Field(
+        ..., min_length=1, max_length=MAX_BULK_EXPORT_DOCUMENTS, description="The documents to export"
+    )
+    formats: List[ExportFormat] = Field(
+        default_factory=lambda: [ExportFormat.PDF, ExportFormat.DOCX, ExportFormat.TXT],
+        min_length=1,
+        description="The export formats for every document"
+    )
+
+    @field_validator("formats")
+    @classmethod
+    def unique_formats(cls, formats: List[ExportFormat]) -> List[ExportFormat]:
+        """Drop repeated formats, which would write duplicate archive entries."""
+        return list(dict.fromkeys(formats))
+
 class DocumentResponse(BaseModel):
     """
     DocumentResponse represents the response from generating a document.
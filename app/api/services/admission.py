@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from app.api.services.metrics import REGISTRY
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ADMISSION_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "admission_queue_wait_seconds",
+    "Time LLM requests waited for an admission slot.",
+    ("route",)
+)
+ADMISSION_IN_FLIGHT = REGISTRY.gauge("admission_in_flight", "LLM requests holding an admission slot.")
+ADMISSION_QUEUED = REGISTRY.gauge("admission_queued", "LLM requests waiting for an admission slot.")
+ADMISSION_REJECTED = REGISTRY.counter(
+    "admission_rejected_total",
+    "LLM requests rejected with 429, by reason.",
+    ("route", "reason")
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted; maps to HTTP 429."""
+
+    def __init__(self, reason: str, message: str, retry_after: float):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills ``rate`` tokens per second up to ``burst``."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens; return 0 on success or the seconds until they are available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def refund(self, cost: float = 1.0) -> None:
+        """Return tokens taken for a request that was not served."""
+        self.tokens = min(self.burst, self.tokens + cost)
+
+
+class RateLimiter:
+    """Token bucket per client key, for at most ``max_clients`` recently seen clients."""
+
+    def __init__(self, per_minute: float, burst: float, max_clients: int = 10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client: str, cost: float = 1.0) -> float:
+        """Charge ``cost`` to a client's bucket; see :meth:`TokenBucket.take`.
+
+        A cost above the burst size can never be paid; callers bound it first.
+        """
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(client)
+            return bucket.take(cost)
+
+    def refund(self, client: str, cost: float = 1.0) -> None:
+        """Give back ``cost`` taken from a client's bucket; a forgotten client already starts full."""
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is not None:
+                bucket.refund(cost)
+
+
+class AdmissionSlot:
+    """A granted slot; ``release()`` and ``refund()`` are safe to call more than once."""
+
+    def __init__(self, controller: "AdmissionController", queue_wait: float):
+        self._controller = controller
+        self.queue_wait = queue_wait
+        self._released = False
+        # Rate-limit charge returned by refund(), set by AdmissionController.acquire
+        self._charge: Optional[Tuple[str, float]] = None
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+    def refund(self) -> None:
+        """Return the request's rate-limit tokens when it fails without being served."""
+        if self._charge is not None:
+            client, cost = self._charge
+            self._charge = None
+            self._controller.refund(client, cost)
+
+    def hold(self, events: AsyncIterator) -> AsyncIterator:
+        """Wrap a response stream so the slot is held until the stream ends or is dropped."""
+        async def held():
+            try:
+                async for event in events:
+                    yield event
+            finally:
+                self.release()
+
+        stream = held()
+        # A stream that is never started (client gone before the body) never
+        # runs its finally block; release when it is garbage collected instead
+        weakref.finalize(stream, self.release)
+        return stream
+
+
+class AdmissionController:
+    """Admission in front of the LLM routes.
+
+    A client first pays for the request from its token bucket. The request
+    then takes one of ``max_concurrency`` slots or waits in a queue of at
+    most ``max_queue`` requests for up to ``queue_timeout`` seconds. A full
+    queue or an expired wait is rejected at once, so waiting time stays
+    bounded under load spikes; the rejected request's tokens are refunded.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        max_queue: int = 32,
+        queue_timeout: float = 10.0,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate_limiter = rate_limiter
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+        self.queue_wait_seconds_total = 0.0
+        self.queue_wait_seconds_max = 0.0
+
+    def _reject(self, route: str, reason: str, message: str, retry_after: float) -> AdmissionRejected:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        ADMISSION_REJECTED.inc(route=route, reason=reason)
+        logger.warning(f"Rejected {route} request: {message}")
+        return AdmissionRejected(reason, message, retry_after)
+
+    async def acquire(self, client: str, route: str, cost: float = 1.0) -> AdmissionSlot:
+        """Admit a request or raise :class:`AdmissionRejected`."""
+        self.charge(client, route, cost)
+        try:
+            slot = await self.acquire_slot(route)
+        except AdmissionRejected:
+            self.refund(client, cost)
+            raise
+        slot._charge = (client, cost)
+        return slot
+
+    def charge(self, client: str, route: str, cost: float = 1.0) -> None:
+        """Charge ``cost`` requests to the client's rate limit or raise :class:`AdmissionRejected`."""
+        if self.rate_limiter is not None:
+            retry_after = self.rate_limiter.take(client, cost)
+            if retry_after:
+                raise self._reject(route, "rate_limited", "Rate limit exceeded", retry_after)
+
+    def refund(self, client: str, cost: float = 1.0) -> None:
+        """Return ``cost`` to the client's rate limit for requests that were not served."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.refund(client, cost)
+
+    async def acquire_slot(self, route: str) -> AdmissionSlot:
+        """Take a concurrency slot, waiting in the bounded queue, without charging the rate limit.
+
+        Batches are charged once for all their items and then take a slot
+        per item as it starts, so they share capacity with single requests.
+        """
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            raise self._reject(route, "queue_full", "Server is at capacity, try again shortly", 1.0)
+
+        start = time.perf_counter()
+        self.queued += 1
+        ADMISSION_QUEUED.inc()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject(route, "queue_timeout", "Timed out waiting for capacity", 1.0)
+        finally:
+            self.queued -= 1
+            ADMISSION_QUEUED.dec()
+
+        wait = time.perf_counter() - start
+        self.in_flight += 1
+        self.admitted += 1
+        self.queue_wait_seconds_total += wait
+        self.queue_wait_seconds_max = max(self.queue_wait_seconds_max, wait)
+        ADMISSION_IN_FLIGHT.inc()
+        ADMISSION_QUEUE_WAIT_SECONDS.observe(wait, route=route)
+        return AdmissionSlot(self, wait)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.dec()
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, object]:
+        """Return slot usage, queue depth, wait times and rejections."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "queue_wait_seconds_avg": round(self.queue_wait_seconds_total / self.admitted, 4) if self.admitted else 0.0,
+            "queue_wait_seconds_max": round(self.queue_wait_seconds_max, 4),
+        }
+
+
+def create_admission_controller() -> AdmissionController:
+    """Create the controller configured through ADMISSION_* and RATE_LIMIT_* variables.
+
+    ADMISSION_MAX_CONCURRENCY defaults to LLM_MAX_CONCURRENCY. RATE_LIMIT_PER_MINUTE
+    is the sustained per-client rate and RATE_LIMIT_BURST the bucket size;
+    a rate of 0 disables per-client limiting. Limits apply per worker process.
+    """
+    per_minute = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+    rate_limiter = None
+    if per_minute > 0:
+        rate_limiter = RateLimiter(
+            per_minute,
+            burst=float(os.getenv("RATE_LIMIT_BURST", "10")),
+            max_clients=int(os.getenv("RATE_LIMIT_CLIENTS", "10000"))
+        )
+    return AdmissionController(
+        max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", os.getenv("LLM_MAX_CONCURRENCY", "16"))),
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+        rate_limiter=rate_limiter
+    )
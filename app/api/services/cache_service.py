@@ -0,0 +1,372 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Build a stable content-addressed key from the given parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Base class for key/value caches with hit/miss accounting.
+
+    The ``a``-prefixed methods are for async code: backends that do disk or
+    network I/O (``blocking``) run them on a worker thread, so a slow or
+    locked backend never stalls the event loop.
+    """
+
+    backend_name = "base"
+    blocking = False
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _record(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl else None
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        value = self._get(key)
+        self._record(value is not None)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store value under key."""
+        self._set(key, value)
+
+    def update(self, key: str, fn: Callable[[Optional[Any]], Optional[Any]]) -> Optional[Any]:
+        """Atomically replace the value under key with ``fn(current)`` and return it.
+
+        ``current`` is None for a missing key; when ``fn`` returns None the
+        stored value is left unchanged. Atomic across every process sharing
+        the backend, so concurrent read-modify-write updates are not lost.
+        """
+        return self._update(key, fn)
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """Async :meth:`get`."""
+        return await self._call(self.get, key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        """Async :meth:`set`."""
+        await self._call(self.set, key, value)
+
+    async def aupdate(self, key: str, fn: Callable[[Optional[Any]], Optional[Any]]) -> Optional[Any]:
+        """Async :meth:`update`; ``fn`` runs on the worker thread for blocking backends."""
+        return await self._call(self.update, key, fn)
+
+    async def astats(self) -> Dict[str, Any]:
+        """Async :meth:`stats`."""
+        return await self._call(self.stats)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this cache."""
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self),
+        }
+
+    def _get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def _set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def _update(self, key: str, fn: Callable[[Optional[Any]], Optional[Any]]) -> Optional[Any]:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryCache(ResponseCache):
+    """In-process LRU cache with optional per-entry TTL."""
+
+    backend_name = "memory"
+
+    def __init__(self, max_size: int = 256, ttl: Optional[float] = None):
+        super().__init__(ttl)
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key: str, value: Any) -> None:
+        self._entries[key] = (value, self._expires_at())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _update(self, key: str, fn: Callable[[Optional[Any]], Optional[Any]]) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            current = None
+            if entry is not None and (entry[1] is None or entry[1] >= time.time()):
+                current = entry[0]
+            value = fn(current)
+            if value is not None:
+                self._store(key, value)
+            return value
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(ResponseCache):
+    """On-disk cache backed by one SQLite table; values must be strings.
+
+    The file may be shared by several worker processes on one host: WAL mode
+    lets readers proceed during writes and the busy timeout waits out locks.
+    Every ``purge_every`` writes, expired rows are deleted and the table is
+    trimmed to ``max_size`` rows, least recently written first.
+    """
+
+    backend_name = "sqlite"
+    blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        ttl: Optional[float] = None,
+        table: str = "cache",
+        max_size: Optional[int] = None,
+        purge_every: int = 64
+    ):
+        super().__init__(ttl)
+        if not table.isidentifier():
+            raise ValueError(f"Invalid SQLite table name: {table}")
+        self.path = path
+        self.table = table
+        self.max_size = max_size
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            self._purge()
+            self._conn.commit()
+
+    def _purge(self) -> None:
+        """Delete expired rows and trim the table to ``max_size``; the caller holds the lock and commits."""
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),))
+        if self.max_size is not None:
+            # REPLACE gives a rewritten row a new, highest rowid, so the
+            # lowest rowids are the least recently written entries
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE rowid IN ("
+                f"SELECT rowid FROM {self.table} ORDER BY rowid "
+                f"LIMIT max(0, (SELECT COUNT(*) FROM {self.table}) - ?))",
+                (self.max_size,)
+            )
+
+    def _written(self) -> None:
+        """Count a write and purge periodically; the caller holds the lock and commits."""
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self._purge()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < time.time():
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, self._expires_at()),
+            )
+            self._written()
+            self._conn.commit()
+
+    def _update(self, key: str, fn: Callable[[Optional[str]], Optional[str]]) -> Optional[str]:
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so workers sharing the
+            # file serialize their read-modify-write instead of interleaving
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                current = None
+                if row is not None and (row[1] is None or row[1] >= time.time()):
+                    current = row[0]
+                value = fn(current)
+                if value is not None:
+                    self._conn.execute(
+                        f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, value, self._expires_at()),
+                    )
+                    self._written()
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            return value
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class RedisCache(ResponseCache):
+    """Cache stored in Redis (or a compatible server) under a key namespace; values must be strings.
+
+    Shared by every worker and host pointing at the same server, so it is the
+    backend to use when the API runs on more than one machine.
+    """
+
+    backend_name = "redis"
+    blocking = True
+
+    def __init__(self, url: str, namespace: str, ttl: Optional[float] = None):
+        super().__init__(ttl)
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis state backend requires the 'redis' package")
+        self.prefix = f"{namespace}:"
+        self._client = redis.Redis.from_url(url)
+        self._watch_error = redis.WatchError
+
+    def _get(self, key: str) -> Optional[str]:
+        value = self._client.get(self.prefix + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def _set(self, key: str, value: str) -> None:
+        self._client.set(self.prefix + key, value, ex=int(self.ttl) if self.ttl else None)
+
+    def _update(self, key: str, fn: Callable[[Optional[str]], Optional[str]]) -> Optional[str]:
+        name = self.prefix + key
+        with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    # WATCH makes EXEC fail if another client wrote the key meanwhile
+                    pipe.watch(name)
+                    raw = pipe.get(name)
+                    value = fn(raw.decode("utf-8") if raw is not None else None)
+                    if value is None:
+                        pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    pipe.set(name, value, ex=int(self.ttl) if self.ttl else None)
+                    pipe.execute()
+                    return value
+                except self._watch_error:
+                    continue
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._client.scan_iter(match=self.prefix + "*"))
+
+
+def create_state_backend(
+    namespace: str,
+    backend: Optional[str] = None,
+    ttl: Optional[float] = None,
+    max_size: int = 512,
+    path: Optional[str] = None
+) -> ResponseCache:
+    """Create a key/value backend for shared state such as caches and sessions.
+
+    ``backend`` defaults to STATE_BACKEND: ``memory`` (per process; fine for a
+    single worker), ``sqlite`` (STATE_SQLITE_PATH, shared by workers on one
+    host) or ``redis`` (STATE_REDIS_URL, shared across hosts). ``namespace``
+    keeps different kinds of state apart within one database. ``max_size``
+    bounds the memory and SQLite backends; Redis relies on the TTL and the
+    server's own eviction policy.
+    """
+    backend = (backend or os.getenv("STATE_BACKEND", "memory")).lower()
+    if backend == "memory":
+        return MemoryCache(max_size=max_size, ttl=ttl)
+    if backend == "sqlite":
+        path = path or os.getenv("STATE_SQLITE_PATH", "state.sqlite3")
+        logger.info(f"Using SQLite backend for {namespace} at {path}")
+        return SQLiteCache(path, ttl=ttl, table=namespace, max_size=max_size)
+    if backend == "redis":
+        url = os.getenv("STATE_REDIS_URL", "redis://localhost:6379/0")
+        logger.info(f"Using Redis backend for {namespace}")
+        return RedisCache(url, namespace, ttl=ttl)
+    raise ValueError(f"Unsupported state backend: {backend}")
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """Create the LLM response cache configured through the environment.
+
+    LLM_CACHE_BACKEND selects ``memory``, ``sqlite``, ``redis`` or ``none``
+    and defaults to STATE_BACKEND; LLM_CACHE_TTL is in seconds,
+    LLM_CACHE_SIZE bounds the memory and SQLite caches and LLM_CACHE_PATH
+    overrides the SQLite file.
+    """
+    backend = os.getenv("LLM_CACHE_BACKEND")
+    if backend and backend.lower() == "none":
+        logger.info("LLM response cache disabled")
+        return None
+    return create_state_backend(
+        "llm_cache",
+        backend,
+        ttl=float(os.getenv("LLM_CACHE_TTL", "3600")) or None,
+        max_size=int(os.getenv("LLM_CACHE_SIZE", "512")),
+        path=os.getenv("LLM_CACHE_PATH")
+    )
@@ -0,0 +1,54 @@
+import difflib
+import json
+from typing import Dict, List, Tuple
+
+
+class PatchError(ValueError):
+    """Raised when model-proposed edits cannot be applied to a document."""
+
+
+def parse_edits(text: str) -> List[Dict[str, str]]:
+    """Parse the model's JSON edit list; ``{"edits": null}`` means no patch is possible."""
+    try:
+        payload = json.loads(text.strip().removeprefix("```json").removesuffix("```").strip())
+    except ValueError as e:
+        raise PatchError(f"Edit list is not valid JSON: {e}")
+    edits = payload.get("edits") if isinstance(payload, dict) else payload
+    if not isinstance(edits, list) or not edits:
+        raise PatchError("Model did not return any edits")
+    for edit in edits:
+        if not isinstance(edit, dict) or not isinstance(edit.get("find"), str) or not isinstance(edit.get("replace"), str):
+            raise PatchError(f"Malformed edit: {edit!r}")
+        if not edit["find"]:
+            raise PatchError("Edit has an empty 'find' string")
+    return edits
+
+
+def apply_edits(document: str, edits: List[Dict[str, str]]) -> str:
+    """Apply each edit's find/replace in order; every 'find' must match exactly once.
+
+    An ambiguous 'find' could patch the wrong section, so it fails the patch
+    like a missing one and the caller falls back to a full rewrite.
+    """
+    for edit in edits:
+        matches = document.count(edit["find"])
+        if matches == 0:
+            raise PatchError(f"Text to replace not found in document: {edit['find'][:80]!r}")
+        if matches > 1:
+            raise PatchError(f"Text to replace occurs {matches} times in document: {edit['find'][:80]!r}")
+        document = document.replace(edit["find"], edit["replace"], 1)
+    return document
+
+
+def unified_diff(old: str, new: str) -> str:
+    """Line diff between two document versions."""
+    return "\n".join(difflib.unified_diff(
+        old.splitlines(), new.splitlines(), fromfile="previous", tofile="refined", lineterm=""
+    ))
+
+
+def patch_document(document: str, edit_text: str) -> Tuple[str, List[Dict[str, str]], str]:
+    """Parse and apply an edit list, returning the patched document, edits and diff."""
+    edits = parse_edits(edit_text)
+    patched = apply_edits(document, edits)
+    return patched, edits, unified_diff(document, patched)
@@ -1,25 +1,100 @@
-from fpdf import FPDF
-from docx import Document
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 import tempfile
+import io
 import os
+import asyncio
+import itertools
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+from app.api.services.cache_service import MemoryCache, make_cache_key
+from app.api.services.tracing import get_tracer
+
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain; charset=utf-8",
+}
+
+def safe_name(value: str, allow_unicode: bool = False) -> str:
+    """Reduce a client-supplied label such as a document type to ``[a-z0-9_-]``
+
+    Path separators, dots, quotes and control characters are replaced, so the
+    result cannot escape the archive root when used in a ZIP entry name or
+    break a header. ``allow_unicode`` also keeps non-ASCII letters and digits.
+    """
+    pattern = r"[^\w-]+" if allow_unicode else r"[^a-z0-9_-]+"
+    name = re.sub(pattern, "_", value.lower()).strip("_")
+    return name or "document"
+
+def content_disposition(filename: str) -> str:
+    """Attachment header for ``filename``, using RFC 5987 encoding like Starlette's FileResponse"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """Write-only, non-seekable sink that lets zipfile emit an archive incrementally."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        """Return and forget everything written since the last drain"""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
 
 class DocumentExporter:
     def __init__(self):
         self.tum_blue = (0, 101, 189)  # TUM Corporate Blue
         self.temp_dir = tempfile.gettempdir()
+        # Rendered files keyed by (content, metadata, format); the TTL keeps
+        # the embedded "Generated on" stamp from going stale indefinitely
+        self.render_cache = MemoryCache(
+            max_size=int(os.getenv("EXPORT_CACHE_SIZE", "128")),
+            ttl=float(os.getenv("EXPORT_CACHE_TTL", "3600")) or None
+        )
+        # Worker pool used for bulk exports
+        self.workers = int(os.getenv("EXPORT_WORKERS", "4"))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export")
+        # Renders in flight per bulk export; bounds the bytes held for a slow reader
+        self.zip_window = int(os.getenv("EXPORT_ZIP_WINDOW", str(self.workers * 2)))
 
     def _create_filename(self, doc_type: str, extension: str) -> str:
         """Create a standardized filename with timestamp"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_doc_type = doc_type.lower().replace(" ", "_")
-        return f"TUM_{safe_doc_type}_{timestamp}.{extension}"
+        return f"TUM_{safe_name(doc_type, allow_unicode=True)}_{timestamp}.{extension}"
+
+    def download_filename(self, metadata: Dict[str, str], format: str) -> str:
+        """Filename suggested to clients downloading an export"""
+        return self._create_filename(metadata.get('doc_type', 'document'), format)
+
+    def write_file(self, data: bytes, metadata: Dict[str, str], extension: str) -> str:
+        """Write rendered bytes to a uniquely named temp file and return its path"""
+        stem, _ = os.path.splitext(self._create_filename(metadata.get('doc_type', 'document'), extension))
+        # mkstemp guarantees a fresh name even for several exports within one second
+        fd, filepath = tempfile.mkstemp(prefix=f"{stem}_", suffix=f".{extension}", dir=self.temp_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return filepath
+
+    def render_pdf(self, content: str, metadata: Dict[str, str]) -> bytes:
+        """Render document to PDF bytes with TUM formatting"""
+        # Imported here so API workers that never export skip loading fpdf
+        from fpdf import FPDF
 
-    def export_to_pdf(self, content: str, metadata: Dict[str, str]) -> str:
-        """Export document to PDF with TUM formatting"""
         pdf = FPDF()
         pdf.add_page()
         
@@ -39,15 +114,17 @@ class DocumentExporter:
         pdf.set_text_color(0, 0, 0)
         pdf.multi_cell(0, 10, content)
         
-        # Save to temp file
-        filename = self._create_filename(metadata.get('doc_type', 'document'), "pdf")
-        filepath = os.path.join(self.temp_dir, filename)
-        pdf.output(filepath)
-        
-        return filepath
+        # Render in memory; fpdf returns a latin-1 str, fpdf2 a bytearray
+        data = pdf.output(dest="S")
+        if isinstance(data, str):
+            data = data.encode("latin-1")
+        return bytes(data)
+
+    def render_docx(self, content: str, metadata: Dict[str, str]) -> bytes:
+        """Render document to DOCX bytes with TUM formatting"""
+        from docx import Document
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
 
-    def export_to_docx(self, content: str, metadata: Dict[str, str]) -> str:
-        """Export document to DOCX with TUM formatting"""
         doc = Document()
         
         # Add header
@@ -64,27 +141,57 @@ class DocumentExporter:
         # Add content
         doc.add_paragraph(content)
         
-        # Save to temp file
-        filename = self._create_filename(metadata.get('doc_type', 'document'), "docx")
-        filepath = os.path.join(self.temp_dir, filename)
-        doc.save(filepath)
-        
-        return filepath
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        return buffer.getvalue()
+
+    def render_txt(self, content: str, metadata: Dict[str, str]) -> bytes:
+        """Render document to plain text bytes with minimal formatting"""
+        text = (
+            f"TUM {metadata.get('doc_type', 'Document')}\n"
+            + "=" * 50 + "\n\n"
+            + f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n"
+            + f"Tone: {metadata.get('tone', 'Standard')}\n"
+            + "=" * 50 + "\n\n"
+            + content
+        )
+        return text.encode("utf-8")
+
+    def render_cache_key(self, content: str, metadata: Dict[str, str], format: str) -> str:
+        """Key under which a rendered export is memoized"""
+        return make_cache_key(content, sorted(metadata.items()), format)
+
+    def render_uncached(self, content: str, metadata: Dict[str, str], format: str) -> bytes:
+        """Render document bytes in the specified format without consulting the cache"""
+        renderers = {
+            "pdf": self.render_pdf,
+            "docx": self.render_docx,
+            "txt": self.render_txt,
+        }
+        if format not in renderers:
+            raise ValueError(f"Unsupported format: {format}")
+        return renderers[format](content, metadata)
+
+    def render(self, content: str, metadata: Dict[str, str], format: str) -> bytes:
+        """Render document bytes in the specified format, reusing cached results"""
+        key = self.render_cache_key(content, metadata, format)
+        data = self.render_cache.get(key)
+        if data is None:
+            data = self.render_uncached(content, metadata, format)
+            self.render_cache.set(key, data)
+        return data
+
+    def export_to_pdf(self, content: str, metadata: Dict[str, str]) -> str:
+        """Export document to PDF with TUM formatting"""
+        return self.write_file(self.render(content, metadata, "pdf"), metadata, "pdf")
+
+    def export_to_docx(self, content: str, metadata: Dict[str, str]) -> str:
+        """Export document to DOCX with TUM formatting"""
+        return self.write_file(self.render(content, metadata, "docx"), metadata, "docx")
 
     def export_to_txt(self, content: str, metadata: Dict[str, str]) -> str:
         """Export document to plain text with minimal formatting"""
-        filename = self._create_filename(metadata.get('doc_type', 'document'), "txt")
-        filepath = os.path.join(self.temp_dir, filename)
-        
-        with open(filepath, 'w') as f:
-            f.write(f"TUM {metadata.get('doc_type', 'Document')}\n")
-            f.write("=" * 50 + "\n\n")
-            f.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n")
-            f.write(f"Tone: {metadata.get('tone', 'Standard')}\n")
-            f.write("=" * 50 + "\n\n")
-            f.write(content)
-        
-        return filepath
+        return self.write_file(self.render(content, metadata, "txt"), metadata, "txt")
 
     def export_document(self, content: str, metadata: Dict[str, str], format: str) -> str:
         """Export document in the specified format"""
@@ -95,4 +202,84 @@ class DocumentExporter:
         elif format == "txt":
             return self.export_to_txt(content, metadata)
         else:
-            raise ValueError(f"Unsupported format: {format}") 
\ No newline at end of file
+            raise ValueError(f"Unsupported format: {format}")
+
+    @staticmethod
+    def _write_zip_entry(archive: zipfile.ZipFile, name: str, data) -> None:
+        """Add one entry; PDF and DOCX are already compressed, so only text is deflated"""
+        compress_type = zipfile.ZIP_DEFLATED if name.endswith(".txt") else zipfile.ZIP_STORED
+        archive.writestr(name, data, compress_type=compress_type)
+
+    async def export_zip_stream(
+        self,
+        documents: List[Tuple[str, Dict[str, str]]],
+        formats: List[str],
+        render: Optional[Callable[[str, Dict[str, str], str], Awaitable[bytes]]] = None
+    ) -> AsyncGenerator[bytes, None]:
+        """Render documents across the worker pool and stream a ZIP archive as entries finish
+
+        ``render`` may be an async renderer such as ``RenderPool.render``; by
+        default entries are rendered on this exporter's thread pool. At most
+        ``zip_window`` renders are in flight, and entries are compressed on
+        the thread pool rather than the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if render is None:
+            async def render(content: str, metadata: Dict[str, str], format: str) -> bytes:
+                return await loop.run_in_executor(self.executor, self.render, content, metadata, format)
+        buffer = _ZipStreamBuffer()
+        archive = zipfile.ZipFile(buffer, mode="w")
+        # Not a current span: the archive is streamed across many yields
+        span = get_tracer().start_span("export.zip", documents=len(documents), formats=",".join(formats))
+
+        async def render_entry(index: int, content: str, metadata: Dict[str, str], format: str):
+            safe_doc_type = safe_name(metadata.get('doc_type', 'document'))
+            name = f"{index + 1:04d}_TUM_{safe_doc_type}.{format}"
+            try:
+                data = await render(content, metadata, format)
+                return name, data, None
+            except Exception as e:
+                return name, None, str(e)
+
+        entries = (
+            (index, content, metadata, format)
+            for index, (content, metadata) in enumerate(documents)
+            for format in formats
+        )
+        window = max(1, self.zip_window)
+        pending = set()
+
+        def fill() -> None:
+            for entry in itertools.islice(entries, window - len(pending)):
+                pending.add(asyncio.create_task(render_entry(*entry)))
+
+        errors = []
+        zip_bytes = 0
+        try:
+            fill()
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.difference_update(done)
+                # Keep the workers busy while finished entries are written out
+                fill()
+                for task in done:
+                    name, data, error = task.result()
+                    if error is not None:
+                        errors.append(f"{name}: {error}")
+                        continue
+                    await loop.run_in_executor(self.executor, self._write_zip_entry, archive, name, data)
+                    chunk = buffer.drain()
+                    zip_bytes += len(chunk)
+                    yield chunk
+            if errors:
+                self._write_zip_entry(archive, "errors.txt", "\n".join(errors))
+            archive.close()
+            chunk = buffer.drain()
+            zip_bytes += len(chunk)
+            yield chunk
+        finally:
+            for task in pending:
+                task.cancel()
+            span.set_attribute("errors", len(errors))
+            span.set_attribute("bytes", zip_bytes)
+            span.end()
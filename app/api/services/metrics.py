@@ -0,0 +1,309 @@
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Default latency buckets in seconds, from cache hits up to slow generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base class for a named metric family with optional labels."""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, such as requests in flight."""
+
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[idx] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, (("le", _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Metric whose values are read from ``callback`` at scrape time.
+
+    For counts kept elsewhere, such as cache hit counters, so they can be
+    exposed with their real type. ``callback`` returns values keyed by
+    label value tuples.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        metric_type: str,
+        callback: Callable[[], Dict[Tuple[str, ...], float]]
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.metric_type = metric_type
+        self.callback = callback
+
+    def _samples(self) -> List[str]:
+        items = sorted(self.callback().items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class MetricsRegistry:
+    """Holds metric families and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        metric_type: str,
+        callback: Callable[[], Dict[Tuple[str, ...], float]]
+    ) -> CallbackMetric:
+        return self._register(CallbackMetric(name, documentation, labelnames, metric_type, callback))
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus exposition format."""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+# Process-wide registry. With several server workers each process keeps its
+# own values, so scrape every worker or run a single one per scrape target.
+REGISTRY = MetricsRegistry()
+
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "llm_request_duration_seconds",
+    "Gemini call latency, from sending the prompt to the last chunk.",
+    ("operation",)
+)
+LLM_FIRST_CHUNK_SECONDS = REGISTRY.histogram(
+    "llm_time_to_first_chunk_seconds",
+    "Time from sending a streaming Gemini request to its first chunk.",
+    ("operation",)
+)
+LLM_IN_FLIGHT = REGISTRY.gauge(
+    "llm_requests_in_flight",
+    "Gemini calls currently holding a concurrency slot."
+)
+SSE_FIRST_CHUNK_SECONDS = REGISTRY.histogram(
+    "sse_time_to_first_chunk_seconds",
+    "Time from receiving a streaming request to sending its first SSE event.",
+    ("endpoint",)
+)
+EXPORT_RENDER_SECONDS = REGISTRY.histogram(
+    "export_render_duration_seconds",
+    "Time spent rendering one export, excluding queue wait and cache hits.",
+    ("format",)
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response body is complete.",
+    ("method", "endpoint", "status")
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served, including open streams.",
+    ("endpoint",)
+)
+ERRORS = REGISTRY.counter(
+    "errors_total",
+    "Errors by component and exception type or HTTP status.",
+    ("component", "type")
+)
+
+
+def register_cache_metrics(counters: Callable[[], Dict[str, Tuple[int, int]]]) -> None:
+    """Expose cache hit/miss counters, read from ``counters()`` at every scrape.
+
+    ``counters`` returns ``(hits, misses)`` since the process started, keyed
+    by cache name; hits and misses are counters, the hit ratio a gauge.
+    """
+    def read(field: Callable[[int, int], float]) -> Callable[[], Dict[Tuple[str, ...], float]]:
+        return lambda: {(cache,): field(hits, misses) for cache, (hits, misses) in counters().items()}
+
+    REGISTRY.callback(
+        "cache_hits_total", "Cache hits since the process started.", ("cache",), "counter",
+        read(lambda hits, misses: hits)
+    )
+    REGISTRY.callback(
+        "cache_misses_total", "Cache misses since the process started.", ("cache",), "counter",
+        read(lambda hits, misses: misses)
+    )
+    REGISTRY.callback(
+        "cache_hit_ratio", "Cache hits divided by lookups.", ("cache",), "gauge",
+        read(lambda hits, misses: round(hits / (hits + misses), 4) if hits + misses else 0.0)
+    )
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording in-flight requests, latency and server errors.
+
+    Timing runs until the last body chunk is sent, so streamed responses are
+    measured in full. Requests are labelled with their route path, e.g.
+    ``/api/sessions/{session_id}``, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _endpoint(self, scope) -> str:
+        from starlette.routing import Match
+
+        router = scope["app"].router if "app" in scope else None
+        for route in getattr(router, "routes", []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._endpoint(scope)
+        # Stays 500 when the app raises before sending a response
+        status = {"code": 500}
+        raised = False
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(endpoint=endpoint)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            raised = True
+            ERRORS.inc(component="http", type=type(e).__name__)
+            raise
+        finally:
+            HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, method=scope["method"], endpoint=endpoint, status=str(status["code"])
+            )
+            # An unhandled exception is already counted by its type
+            if status["code"] >= 500 and not raised:
+                ERRORS.inc(component="http", type=str(status["code"]))
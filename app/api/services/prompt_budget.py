@@ -0,0 +1,80 @@
+import difflib
+import logging
+import math
+import os
+from typing import List, Optional, Tuple
+
+from app.api.services.cache_service import MemoryCache, make_cache_key
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for Gemini on English/German prose
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate that needs no API round-trip."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class HistoryBudget:
+    """Builds the refinement history section within a fixed token budget.
+
+    The newest ``verbatim_versions`` entries are kept in full. Older entries
+    are replaced by a line diff against the version that followed them, and
+    the diffs are cached because the same pair recurs on every later turn.
+    If the section still exceeds ``max_tokens``, the oldest entries are
+    dropped.
+    """
+
+    def __init__(self, verbatim_versions: int = 2, max_tokens: int = 1500, cache_size: int = 256):
+        self.verbatim_versions = verbatim_versions
+        self.max_tokens = max_tokens
+        self.diff_cache = MemoryCache(max_size=cache_size)
+
+    def _compress(self, older: str, newer: str) -> str:
+        key = make_cache_key(older, newer)
+        compressed = self.diff_cache.get(key)
+        if compressed is None:
+            diff = difflib.unified_diff(
+                newer.splitlines(), older.splitlines(), fromfile="next version", tofile="this version", n=0, lineterm=""
+            )
+            compressed = "\n".join(diff) or "(identical to the next version)"
+            self.diff_cache.set(key, compressed)
+        return compressed
+
+    def build_history_section(self, history: Optional[List[str]], current_document: str = "") -> Tuple[str, int]:
+        """Return the history prompt section and its estimated token count."""
+        if not history:
+            return "", 0
+        # Each entry is compressed against its successor; the last one against the current document
+        successors = list(history[1:]) + [current_document]
+        entries = []
+        for idx, (document, successor) in enumerate(zip(history, successors)):
+            if idx >= len(history) - self.verbatim_versions:
+                entries.append(document)
+            else:
+                entries.append(f"(changes relative to the next version)\n{self._compress(document, successor)}")
+
+        # Drop the oldest entries until the section fits the budget
+        while len(entries) > 1 and sum(estimate_tokens(e) for e in entries) > self.max_tokens:
+            entries.pop(0)
+        if estimate_tokens(entries[0]) > self.max_tokens:
+            entries[0] = entries[0][-self.max_tokens * CHARS_PER_TOKEN:]
+
+        offset = len(history) - len(entries)
+        section = "\n\nPrevious Conversation/Document History (oldest first):\n-----------------\n"
+        for idx, entry in enumerate(entries):
+            section += f"[{offset + idx + 1}] {entry}\n"
+        section += "-----------------\n"
+        return section, estimate_tokens(section)
+
+
+def create_history_budget() -> HistoryBudget:
+    """Create the history budget configured through REFINE_HISTORY_* variables."""
+    return HistoryBudget(
+        verbatim_versions=int(os.getenv("REFINE_HISTORY_VERBATIM", "2")),
+        max_tokens=int(os.getenv("REFINE_HISTORY_TOKEN_BUDGET", "1500"))
+    )
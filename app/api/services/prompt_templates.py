@@ -0,0 +1,148 @@
+import logging
+import os
+import string
+import threading
+import time
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from app.api.services.tracing import get_tracer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts")
+
+GENERATION_FIELDS = frozenset({"prompt", "tone", "sender_name", "sender_profession", "language", "additional_context"})
+REFINEMENT_FIELDS = frozenset({"doc_type", "history_section", "current_document", "refinement_prompt"})
+
+# Template name -> placeholders it must contain (and may not exceed)
+TEMPLATE_SPECS: Dict[str, FrozenSet[str]] = {
+    "preamble": frozenset(),
+    "announcement": GENERATION_FIELDS,
+    "student_communication": GENERATION_FIELDS,
+    "meeting_summary": GENERATION_FIELDS,
+    "refinement": REFINEMENT_FIELDS,
+    "refinement_patch": REFINEMENT_FIELDS,
+}
+
+
+class TemplateError(ValueError):
+    """Raised when a prompt template is missing or its placeholders are invalid."""
+
+
+class CompiledTemplate:
+    """A prompt template parsed once into literal segments and placeholder names."""
+
+    def __init__(self, name: str, text: str, required: FrozenSet[str]):
+        self.name = name
+        self.text = text
+        try:
+            parsed = list(string.Formatter().parse(text))
+        except ValueError as e:
+            raise TemplateError(f"Template '{name}' is malformed: {e}")
+        self.segments: List[Tuple[str, Optional[str]]] = []
+        for literal, field, format_spec, conversion in parsed:
+            if field is not None and (not field.isidentifier() or format_spec or conversion):
+                raise TemplateError(f"Template '{name}' has unsupported placeholder '{{{field}}}'")
+            self.segments.append((literal, field))
+        fields = {field for _, field in self.segments if field is not None}
+        missing, unexpected = required - fields, fields - required
+        if missing or unexpected:
+            raise TemplateError(
+                f"Template '{name}' placeholders do not match: missing {sorted(missing)}, unexpected {sorted(unexpected)}"
+            )
+
+    def render(self, **values: object) -> str:
+        """Fill in placeholders; every required value must be given."""
+        return "".join(
+            literal + (str(values[field]) if field is not None else "")
+            for literal, field in self.segments
+        )
+
+
+class TemplateRegistry:
+    """Loads, validates and serves prompt templates from a directory.
+
+    All templates are compiled at construction, so a broken template stops the
+    service from starting. With ``hot_reload`` the files are re-checked on use
+    and changed ones recompiled; a broken edit is logged and the previous
+    version kept.
+    """
+
+    def __init__(self, directory: str = PROMPT_DIR, specs: Dict[str, FrozenSet[str]] = TEMPLATE_SPECS, hot_reload: bool = False):
+        self.directory = directory
+        self.specs = specs
+        self.hot_reload = hot_reload
+        self._templates: Dict[str, CompiledTemplate] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.render_seconds_total = 0.0
+        for name in specs:
+            self._load(name)
+        logger.info(f"Loaded {len(self._templates)} prompt templates from {directory}")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.txt")
+
+    def _load(self, name: str) -> None:
+        path = self._path(name)
+        try:
+            mtime = os.path.getmtime(path)
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+        except OSError as e:
+            raise TemplateError(f"Cannot read template '{name}': {e}")
+        self._templates[name] = CompiledTemplate(name, text, self.specs[name])
+        self._mtimes[name] = mtime
+
+    def _maybe_reload(self, name: str) -> None:
+        try:
+            changed = os.path.getmtime(self._path(name)) != self._mtimes[name]
+        except OSError:
+            return
+        if not changed:
+            return
+        with self._lock:
+            try:
+                self._load(name)
+                logger.info(f"Reloaded prompt template '{name}'")
+            except TemplateError as e:
+                logger.error(f"Keeping previous '{name}' template: {str(e)}")
+                self._mtimes[name] = os.path.getmtime(self._path(name))
+
+    def get(self, name: str) -> CompiledTemplate:
+        """Return the compiled template with the given name."""
+        if name not in self._templates:
+            raise TemplateError(f"Unknown template '{name}'")
+        if self.hot_reload:
+            self._maybe_reload(name)
+        return self._templates[name]
+
+    def render(self, name: str, **values: object) -> str:
+        """Render a template and record how long prompt assembly took."""
+        start = time.perf_counter()
+        with get_tracer().span("prompt.render", template=name):
+            prompt = self.get(name).render(**values)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.renders += 1
+            self.render_seconds_total += elapsed
+        return prompt
+
+    def stats(self) -> Dict[str, object]:
+        """Return prompt assembly counters."""
+        return {
+            "templates": sorted(self._templates),
+            "renders": self.renders,
+            "render_microseconds_avg": round(self.render_seconds_total / self.renders * 1e6, 2) if self.renders else 0.0,
+        }
+
+
+def create_template_registry() -> TemplateRegistry:
+    """Create the registry configured through PROMPT_TEMPLATE_DIR and PROMPT_HOT_RELOAD."""
+    return TemplateRegistry(
+        directory=os.getenv("PROMPT_TEMPLATE_DIR", PROMPT_DIR),
+        hot_reload=os.getenv("PROMPT_HOT_RELOAD", "0").lower() in ("1", "true", "yes")
+    )
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from app.api.services.export_service import DocumentExporter
+from app.api.services.metrics import ERRORS, EXPORT_RENDER_SECONDS
+from app.api.services.tracing import get_tracer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Exporter instance owned by each pool worker process
+_worker_exporter: Optional[DocumentExporter] = None
+
+
+def _timed_render(exporter: DocumentExporter, content: str, metadata: Dict[str, str], format: str) -> Tuple[bytes, float]:
+    """Render one export and report how long the render itself took."""
+    start = time.perf_counter()
+    data = exporter.render_uncached(content, metadata, format)
+    return data, time.perf_counter() - start
+
+
+def _render_in_worker(content: str, metadata: Dict[str, str], format: str) -> Tuple[bytes, float]:
+    """Render one export inside a worker process."""
+    global _worker_exporter
+    if _worker_exporter is None:
+        _worker_exporter = DocumentExporter()
+    return _timed_render(_worker_exporter, content, metadata, format)
+
+
+class RenderPool:
+    """Offloads CPU-bound export rendering from the event loop to worker processes.
+
+    EXPORT_PROCESS_WORKERS sets the pool size; ``0`` renders on the exporter's
+    thread pool instead, which keeps the loop free but still shares the GIL.
+    Results are memoized in the exporter's render cache in this process.
+    """
+
+    def __init__(self, exporter: DocumentExporter, workers: Optional[int] = None):
+        self.exporter = exporter
+        self.workers = workers if workers is not None else int(os.getenv("EXPORT_PROCESS_WORKERS", "2"))
+        self._executor = None
+        if self.workers > 0:
+            # spawn keeps workers independent of the server's threads and event loop
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.renders = 0
+        self.failures = 0
+        self.render_seconds_total = 0.0
+        self.render_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+
+    async def render(self, content: str, metadata: Dict[str, str], format: str) -> bytes:
+        """Render document bytes off the event loop, reusing cached results."""
+        with get_tracer().span("export.render", format=format) as span:
+            data = await self._render(content, metadata, format, span)
+            span.set_attribute("bytes", len(data))
+            return data
+
+    async def _render(self, content: str, metadata: Dict[str, str], format: str, span) -> bytes:
+        key = self.exporter.render_cache_key(content, metadata, format)
+        data = self.exporter.render_cache.get(key)
+        span.set_attribute("cache.hit", data is not None)
+        if data is not None:
+            return data
+
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        with self._lock:
+            self.pending += 1
+        try:
+            if self._executor is not None:
+                data, render_seconds = await loop.run_in_executor(
+                    self._executor, _render_in_worker, content, metadata, format
+                )
+            else:
+                data, render_seconds = await loop.run_in_executor(
+                    self.exporter.executor, _timed_render, self.exporter, content, metadata, format
+                )
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            ERRORS.inc(component="export", type=type(e).__name__)
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+        elapsed = time.perf_counter() - submitted
+        with self._lock:
+            self.renders += 1
+            self.render_seconds_total += render_seconds
+            self.render_seconds_max = max(self.render_seconds_max, render_seconds)
+            self.wait_seconds_total += max(0.0, elapsed - render_seconds)
+        EXPORT_RENDER_SECONDS.observe(render_seconds, format=format)
+        span.set_attribute("render_ms", round(render_seconds * 1000, 3))
+        span.set_attribute("queue_wait_ms", round(max(0.0, elapsed - render_seconds) * 1000, 3))
+        self.exporter.render_cache.set(key, data)
+        return data
+
+    def stats(self) -> Dict[str, object]:
+        """Return queue depth and render timing counters."""
+        with self._lock:
+            capacity = self.workers or self.exporter.workers
+            return {
+                "mode": "process" if self._executor is not None else "thread",
+                "workers": capacity,
+                "in_flight": self.pending,
+                "queue_depth": max(0, self.pending - capacity),
+                "renders": self.renders,
+                "failures": self.failures,
+                "render_seconds_avg": round(self.render_seconds_total / self.renders, 4) if self.renders else 0.0,
+                "render_seconds_max": round(self.render_seconds_max, 4),
+                "queue_wait_seconds_avg": round(self.wait_seconds_total / self.renders, 4) if self.renders else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,341 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.api.services.metrics import ERRORS, REGISTRY
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LLM_RETRIES = REGISTRY.counter("llm_retries_total", "Gemini attempts retried, by error type.", ("type",))
+LLM_HEDGES = REGISTRY.counter("llm_hedges_total", "Hedged Gemini attempts, by which attempt won.", ("winner",))
+LLM_CIRCUIT_OPEN = REGISTRY.gauge("llm_circuit_open", "1 while the Gemini circuit breaker rejects calls.")
+
+# google.api_core exception classes worth retrying, matched by name so the
+# Gemini SDK does not have to be imported to classify errors
+RETRYABLE_ERROR_NAMES = frozenset({
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "Aborted", "Unknown", "ServerError",
+})
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class UpstreamError(Exception):
+    """Gemini could not serve the call; carries the HTTP status to report."""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UpstreamTimeout(UpstreamError):
+    """The call's deadline passed before Gemini answered."""
+
+    status_code = 504
+
+
+class CircuitOpenError(UpstreamError):
+    """Calls are rejected without contacting Gemini while the breaker is open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error is transient: timeouts, connection failures, 429 and 5xx responses."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    try:
+        return int(getattr(error, "code", 0) or 0) in RETRYABLE_STATUS_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive transient failures.
+
+    While open, calls fail fast for ``reset_timeout`` seconds. Afterwards the
+    breaker is half-open: calls go through, the first success closes it and
+    the first failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.reset_timeout else "half_open"
+
+    def check(self) -> None:
+        """Raise :class:`CircuitOpenError` if calls are currently rejected."""
+        if self.state == "open":
+            self.rejected += 1
+            ERRORS.inc(component="llm", type="CircuitOpen")
+            retry_after = self.reset_timeout - (time.monotonic() - self.opened_at)
+            raise CircuitOpenError("Gemini is temporarily unavailable, try again shortly", retry_after)
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Gemini circuit breaker closed")
+        self.failures = 0
+        self.opened_at = None
+        LLM_CIRCUIT_OPEN.set(0)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"Gemini circuit breaker opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+            LLM_CIRCUIT_OPEN.set(1)
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies for picking a hedging threshold."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> float:
+        ordered = sorted(self._samples)
+        return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class ResilientCaller:
+    """Deadlines, retries, optional hedging and a circuit breaker around Gemini calls.
+
+    Every attempt has a timeout and the whole call an overall deadline.
+    Transient failures are retried with exponential backoff and full jitter.
+    With hedging, a second attempt starts when the first has not answered
+    (for streams: produced its first chunk) within the recent p95 latency,
+    and whichever finishes first wins. Streams are only retried or hedged
+    before their first chunk, so no text is ever sent twice.
+    """
+
+    def __init__(
+        self,
+        attempt_timeout: float = 60.0,
+        first_chunk_timeout: float = 20.0,
+        stream_idle_timeout: float = 30.0,
+        deadline: float = 120.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        backoff_max: float = 8.0,
+        hedge: bool = False,
+        hedge_after: Optional[float] = None,
+        hedge_default: float = 2.0,
+        hedge_min_samples: int = 20,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.attempt_timeout = attempt_timeout
+        self.first_chunk_timeout = first_chunk_timeout
+        self.stream_idle_timeout = stream_idle_timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.hedge_default = hedge_default
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self._latency = {"call": LatencyTracker(), "stream": LatencyTracker()}
+
+    def _hedge_delay(self, kind: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        if self.hedge_after is not None:
+            return self.hedge_after
+        tracker = self._latency[kind]
+        return tracker.percentile(95) if len(tracker) >= self.hedge_min_samples else self.hedge_default
+
+    def _backoff_delay(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    async def _discard(task: "asyncio.Task", cleanup: Optional[Callable[[Any], Awaitable[None]]]) -> None:
+        """Cancel a losing attempt and release whatever it produced."""
+        task.cancel()
+        try:
+            result = await task
+        except BaseException:
+            return
+        if cleanup is not None:
+            await cleanup(result)
+
+    async def _attempt(
+        self,
+        start_attempt: Callable[[], Awaitable[Any]],
+        kind: str,
+        timeout: float,
+        cleanup: Optional[Callable[[Any], Awaitable[None]]] = None
+    ) -> Any:
+        """Run one attempt, hedged with a second one if it is slow; raise on timeout."""
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(start_attempt())
+        pending = {primary}
+        hedge_delay = self._hedge_delay(kind)
+        hedge_task = None
+        try:
+            if hedge_delay is not None and hedge_delay < timeout:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done:
+                    hedge_task = asyncio.ensure_future(start_attempt())
+                    pending.add(hedge_task)
+            error: Optional[BaseException] = None
+            while pending:
+                remaining = timeout - (time.perf_counter() - started)
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedge_task is not None:
+                            LLM_HEDGES.inc(winner="hedge" if task is hedge_task else "primary")
+                        self._latency[kind].observe(time.perf_counter() - started)
+                        for other in pending:
+                            await self._discard(other, cleanup)
+                        pending = set()
+                        return task.result()
+                    error = task.exception()
+            if error is not None and not pending:
+                raise error
+            raise asyncio.TimeoutError(f"No response from Gemini within {timeout:.1f}s")
+        finally:
+            for task in pending:
+                await self._discard(task, cleanup)
+
+    async def _with_retries(
+        self,
+        start_attempt: Callable[[], Awaitable[Any]],
+        kind: str,
+        attempt_timeout: float,
+        cleanup: Optional[Callable[[Any], Awaitable[None]]] = None
+    ) -> Any:
+        self.breaker.check()
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            remaining = self.deadline - (time.perf_counter() - started)
+            if remaining <= 0:
+                raise UpstreamTimeout(f"Gemini did not answer within the {self.deadline:.0f}s deadline")
+            try:
+                result = await self._attempt(start_attempt, kind, min(attempt_timeout, remaining), cleanup)
+            except Exception as e:
+                if not is_retryable(e):
+                    # Gemini answered (e.g. invalid request), so it is healthy
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.retries or self.breaker.state == "open":
+                    logger.error(f"Gemini call failed after {attempt + 1} attempts: {type(e).__name__}: {str(e)}")
+                    if isinstance(e, (asyncio.TimeoutError, TimeoutError)):
+                        raise UpstreamTimeout(f"Gemini timed out after {attempt + 1} attempts")
+                    raise UpstreamError(f"Gemini is unavailable after {attempt + 1} attempts: {str(e)}")
+                delay = min(self._backoff_delay(attempt), max(0.0, self.deadline - (time.perf_counter() - started)))
+                LLM_RETRIES.inc(type=type(e).__name__)
+                logger.warning(f"Retrying Gemini call in {delay:.2f}s after {type(e).__name__}: {str(e)}")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def call(self, request: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``request()`` (a fresh Gemini call per attempt) with retries and deadlines."""
+        return await self._with_retries(request, "call", self.attempt_timeout)
+
+    async def stream(self, request: Callable[[], Awaitable[Any]]) -> AsyncIterator[Any]:
+        """Yield the chunks of a streaming Gemini call made by ``request()``.
+
+        Attempts are retried and hedged until one produces its first chunk;
+        after that, a chunk gap longer than the idle timeout ends the stream
+        with :class:`UpstreamTimeout`.
+        """
+        async def close(opened: Tuple[Optional[Any], Optional[AsyncIterator[Any]]]) -> None:
+            aclose = getattr(opened[1], "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+        async def open_stream() -> Tuple[Optional[Any], Optional[AsyncIterator[Any]]]:
+            response = await request()
+            iterator = response.__aiter__()
+            try:
+                return await iterator.__anext__(), iterator
+            except StopAsyncIteration:
+                return None, None
+            except BaseException:
+                # Failed, timed out or cancelled as the losing hedge before the
+                # first chunk: close the stream so its connection is not leaked
+                await close((None, iterator))
+                raise
+
+        first, iterator = await self._with_retries(open_stream, "stream", self.first_chunk_timeout, close)
+        if iterator is None:
+            return
+        try:
+            yield first
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), self.stream_idle_timeout)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self.breaker.record_failure()
+                    raise UpstreamTimeout(f"Gemini stream stalled for {self.stream_idle_timeout:.0f}s")
+                except Exception as e:
+                    if is_retryable(e):
+                        self.breaker.record_failure()
+                    raise
+                yield chunk
+        finally:
+            await close((first, iterator))
+
+    def stats(self) -> Dict[str, object]:
+        """Return breaker state and the current hedging threshold."""
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "circuit_rejections": self.breaker.rejected,
+            "hedge_after_seconds": {kind: self._hedge_delay(kind) for kind in self._latency},
+        }
+
+
+def create_resilient_caller() -> ResilientCaller:
+    """Create the caller configured through LLM_* resilience variables."""
+    hedge_after = os.getenv("LLM_HEDGE_AFTER")
+    return ResilientCaller(
+        attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT", "60")),
+        first_chunk_timeout=float(os.getenv("LLM_FIRST_CHUNK_TIMEOUT", "20")),
+        stream_idle_timeout=float(os.getenv("LLM_STREAM_IDLE_TIMEOUT", "30")),
+        deadline=float(os.getenv("LLM_DEADLINE", "120")),
+        retries=int(os.getenv("LLM_RETRIES", "2")),
+        backoff=float(os.getenv("LLM_RETRY_BACKOFF", "0.5")),
+        backoff_max=float(os.getenv("LLM_RETRY_BACKOFF_MAX", "8")),
+        hedge=os.getenv("LLM_HEDGE", "0").lower() in ("1", "true", "yes"),
+        hedge_after=float(hedge_after) if hedge_after else None,
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30"))
+        )
+    )
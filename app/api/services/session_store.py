@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.api.services.cache_service import ResponseCache, create_state_backend
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Server-side document versions per conversation session.
+
+    Sessions are stored as JSON in a cache backend, so expiry and eviction come
+    from the backend's TTL and LRU settings. Each write refreshes the TTL.
+    Methods are async and use the backend's async calls, so SQLite and Redis
+    I/O runs off the event loop.
+    """
+
+    def __init__(self, backend: ResponseCache, history_window: int = 3, max_versions: int = 20):
+        self.backend = backend
+        self.history_window = history_window
+        self.max_versions = max_versions
+
+    async def _load(self, session_id: str) -> Optional[Dict[str, object]]:
+        raw = await self.backend.aget(session_id)
+        return json.loads(raw) if raw is not None else None
+
+    async def _save(self, session_id: str, session: Dict[str, object]) -> None:
+        await self.backend.aset(session_id, json.dumps(session))
+
+    async def create_session(self) -> str:
+        """Create an empty session and return its ID."""
+        session_id = uuid.uuid4().hex
+        await self._save(session_id, {"created_at": datetime.now().isoformat(), "versions": []})
+        logger.info(f"Created session {session_id}")
+        return session_id
+
+    async def get_session(self, session_id: str) -> Optional[Dict[str, object]]:
+        """Return the stored session, or None if it is unknown or expired."""
+        return await self._load(session_id)
+
+    async def add_version(self, session_id: str, document: str, metadata: Dict[str, object]) -> Optional[Dict[str, object]]:
+        """Append a document version to a session; returns None for unknown sessions.
+
+        The append is an atomic backend update, so versions written
+        concurrently by several workers are all kept.
+        """
+        version = {
+            "version_id": uuid.uuid4().hex,
+            "document": document,
+            "metadata": metadata,
+            "created_at": datetime.now().isoformat()
+        }
+
+        def append(raw: Optional[str]) -> Optional[str]:
+            if raw is None:
+                return None
+            session = json.loads(raw)
+            session["versions"] = (session["versions"] + [version])[-self.max_versions:]
+            return json.dumps(session)
+
+        if await self.backend.aupdate(session_id, append) is None:
+            return None
+        return version
+
+    async def get_version(self, session_id: str, version_id: Optional[str] = None) -> Optional[Dict[str, object]]:
+        """Return a version by ID, or the latest version when no ID is given."""
+        session = await self._load(session_id)
+        if session is None or not session["versions"]:
+            return None
+        if version_id is None:
+            return session["versions"][-1]
+        for version in session["versions"]:
+            if version["version_id"] == version_id:
+                return version
+        return None
+
+    async def get_history(self, session_id: str, version_id: Optional[str] = None) -> List[str]:
+        """Return up to ``history_window`` documents preceding the given version."""
+        session = await self._load(session_id)
+        if session is None:
+            return []
+        versions = session["versions"]
+        ids = [v["version_id"] for v in versions]
+        end = ids.index(version_id) if version_id in ids else len(versions)
+        return [v["document"] for v in versions[max(0, end - self.history_window):end]]
+
+
+def create_session_store() -> SessionStore:
+    """Create the session store configured through the environment.
+
+    SESSION_STORE_BACKEND selects ``memory``, ``sqlite`` or ``redis`` and
+    defaults to STATE_BACKEND; SESSION_TTL is in seconds, SESSION_STORE_SIZE
+    bounds the memory and SQLite stores, SESSION_STORE_PATH overrides the SQLite file and
+    SESSION_HISTORY_WINDOW is the number of earlier versions passed to
+    refinements.
+    """
+    backend = create_state_backend(
+        "sessions",
+        os.getenv("SESSION_STORE_BACKEND"),
+        ttl=float(os.getenv("SESSION_TTL", "86400")) or None,
+        max_size=int(os.getenv("SESSION_STORE_SIZE", "1000")),
+        path=os.getenv("SESSION_STORE_PATH")
+    )
+    if backend.backend_name == "memory" and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        logger.warning(
+            "Sessions are kept in process memory but several workers are running; "
+            "refinements may miss their session. Set STATE_BACKEND=sqlite or redis."
+        )
+    return SessionStore(
+        backend,
+        history_window=int(os.getenv("SESSION_HISTORY_WINDOW", "3")),
+        max_versions=int(os.getenv("SESSION_MAX_VERSIONS", "20"))
+    )
@@ -0,0 +1,320 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# W3C trace context header carrying the caller's trace and span IDs
+TRACEPARENT_HEADER = "traceparent"
+
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+# Client-supplied IDs are echoed and logged, so only accept plain tokens
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Request ID and innermost open span of the current request (or task)
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def new_request_id() -> str:
+    """Return a fresh request ID; it doubles as the trace ID of the request."""
+    return uuid.uuid4().hex
+
+
+def get_request_id() -> Optional[str]:
+    """Return the request ID of the current request, if any."""
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None) -> Iterator[str]:
+    """Run the enclosed block under a request ID, generating one if needed or invalid."""
+    if not request_id or not _VALID_REQUEST_ID.match(request_id):
+        request_id = new_request_id()
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(token)
+
+
+class _RemoteParent:
+    """The caller's span from an incoming ``traceparent``; parents local spans."""
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+
+class Span:
+    """A timed stage of a request, recorded with OpenTelemetry span fields."""
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, object]):
+        self._tracer = tracer
+        parent = _current_span.get()
+        request_id = get_request_id()
+        self.name = name
+        self.trace_id = parent.trace_id if parent else self._trace_id_for(request_id)
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        if request_id:
+            self.attributes["request.id"] = request_id
+        self.status = "OK"
+        self.start_time_unix_nano = time.time_ns()
+        self._start = time.perf_counter()
+        self._ended = False
+
+    @staticmethod
+    def _trace_id_for(request_id: Optional[str]) -> str:
+        if request_id and _TRACE_ID.match(request_id):
+            return request_id
+        return uuid.uuid4().hex
+
+    def set_attribute(self, key: str, value: object) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException) -> None:
+        self.status = "ERROR"
+        self.attributes["exception.type"] = type(error).__name__
+        self.attributes["exception.message"] = str(error)
+
+    def end(self) -> None:
+        """Finish the span and hand it to the exporter; later calls are ignored."""
+        if self._ended:
+            return
+        self._ended = True
+        duration = time.perf_counter() - self._start
+        self._tracer.export({
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.start_time_unix_nano + int(duration * 1e9),
+            "duration_ms": round(duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        })
+
+
+class Tracer:
+    """Records spans to a JSON-lines log, or through OpenTelemetry when a collector is configured.
+
+    TRACING selects ``json`` (one span per line in TRACE_LOG_PATH), ``otel``
+    (spans go through the OpenTelemetry API to whatever tracer provider the
+    process configured, e.g. via ``opentelemetry-instrument``) or ``none``.
+    It defaults to ``otel`` when OTEL_EXPORTER_OTLP_ENDPOINT is set and the
+    ``opentelemetry`` package is installed, and to ``none`` otherwise.
+
+    The JSON log is written by a background thread and rotated once it
+    reaches TRACE_LOG_MAX_BYTES, keeping TRACE_LOG_BACKUPS old files.
+    """
+
+    def __init__(self, mode: Optional[str] = None, log_path: Optional[str] = None):
+        self.mode = (mode or os.getenv("TRACING") or self._default_mode()).lower()
+        self.log_path = log_path or os.getenv("TRACE_LOG_PATH", "traces.jsonl")
+        self._otel_tracer = None
+        self._queue = None
+        if self.mode == "otel":
+            try:
+                from opentelemetry import trace
+            except ImportError:
+                logger.warning("TRACING=otel but opentelemetry is not installed; writing spans to a JSON log")
+                self.mode = "json"
+            else:
+                self._otel_tracer = trace.get_tracer("tum-admin-assistant")
+        if self.mode not in ("json", "otel", "none"):
+            raise ValueError(f"Unsupported tracing mode: {self.mode}")
+        if self.mode == "json":
+            self._start_log_writer()
+
+    @staticmethod
+    def _default_mode() -> str:
+        if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            try:
+                import opentelemetry  # noqa: F401
+                return "otel"
+            except ImportError:
+                pass
+        return "none"
+
+    def _start_log_writer(self) -> None:
+        """Write the span log from a background thread so request handlers never wait on disk."""
+        handler = logging.handlers.RotatingFileHandler(
+            self.log_path,
+            maxBytes=int(os.getenv("TRACE_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            backupCount=int(os.getenv("TRACE_LOG_BACKUPS", "3")),
+            encoding="utf-8",
+            delay=True
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(self._queue, handler)
+        listener.start()
+        atexit.register(listener.stop)
+
+    def export(self, record: Dict[str, object]) -> None:
+        """Queue a finished span for the JSON span log."""
+        self._queue.put(logging.makeLogRecord({"msg": json.dumps(record, default=str)}))
+
+    def inject(self, headers: Dict[str, str]) -> None:
+        """Add a W3C ``traceparent`` header for the current span to outgoing ``headers``."""
+        if self.mode == "otel":
+            from opentelemetry import propagate
+
+            propagate.inject(headers)
+        elif self.mode == "json":
+            span = _current_span.get()
+            if span is not None:
+                headers[TRACEPARENT_HEADER] = f"00-{span.trace_id}-{span.span_id}-01"
+
+    @contextmanager
+    def remote_parent(self, headers: Dict[str, str]) -> Iterator[None]:
+        """Parent spans opened in the block under the caller's span from ``headers``.
+
+        Without a ``traceparent`` header, a request ID that is a valid trace ID
+        still becomes the trace ID, so client and server spans group together.
+        """
+        if self.mode == "otel":
+            from opentelemetry import context, propagate, trace
+
+            ctx = propagate.extract(headers)
+            request_id = get_request_id()
+            if not trace.get_current_span(ctx).get_span_context().is_valid and request_id and _TRACE_ID.match(request_id):
+                # The span ID is made up: there is no caller span to point at
+                parent = trace.SpanContext(
+                    trace_id=int(request_id, 16),
+                    span_id=random.getrandbits(64),
+                    is_remote=True,
+                    trace_flags=trace.TraceFlags(trace.TraceFlags.SAMPLED)
+                )
+                ctx = trace.set_span_in_context(trace.NonRecordingSpan(parent), ctx)
+            token = context.attach(ctx)
+            try:
+                yield
+            finally:
+                context.detach(token)
+            return
+        match = _TRACEPARENT.match(headers.get(TRACEPARENT_HEADER, ""))
+        if self.mode != "json" or match is None:
+            yield
+            return
+        token = _current_span.set(_RemoteParent(match.group(1), match.group(2)))
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+
+    def start_span(self, name: str, **attributes: object):
+        """Start a span that is not made current; the caller must call ``end()``.
+
+        Use this for stages that span ``yield`` points, such as streams.
+        """
+        if self.mode == "otel":
+            request_id = get_request_id()
+            if request_id:
+                attributes["request.id"] = request_id
+            return self._otel_tracer.start_span(name, attributes=attributes)
+        if self.mode == "none":
+            return _NoopSpan()
+        return Span(self, name, attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes: object) -> Iterator[object]:
+        """Time the enclosed block as a span nested under the current one."""
+        if self.mode == "otel":
+            request_id = get_request_id()
+            if request_id:
+                attributes["request.id"] = request_id
+            with self._otel_tracer.start_as_current_span(name, attributes=attributes) as otel_span:
+                yield otel_span
+            return
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span) if isinstance(span, Span) else None
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            if token is not None:
+                _current_span.reset(token)
+            span.end()
+
+
+class _NoopSpan:
+    """Span stand-in used when tracing is disabled."""
+
+    def set_attribute(self, key: str, value: object) -> None:
+        pass
+
+    def record_exception(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer, created from the environment on first use."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+
+class RequestTracingMiddleware:
+    """ASGI middleware that assigns each request an ID and traces it end to end.
+
+    The ID comes from the ``X-Request-ID`` header (the Streamlit client sends
+    one) or is generated, is echoed in the response header and is attached
+    to every span recorded while serving the request, including streamed
+    bodies. A W3C ``traceparent`` header makes the request span a child of
+    the caller's span.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers") or []
+        }
+        supplied = headers.get(REQUEST_ID_HEADER.lower(), "")
+
+        with request_context(supplied) as request_id, get_tracer().remote_parent(headers):
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (REQUEST_ID_HEADER.lower().encode("latin-1"), request_id.encode("latin-1"))
+                    ]
+                await send(message)
+
+            with get_tracer().span(
+                f"{scope['method']} {scope['path']}",
+                **{"http.method": scope["method"], "http.target": scope["path"]}
+            ) as span:
+                await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,83 @@
+"""
+Pooled HTTP client used by the Streamlit frontend to talk to the backend API.
+"""
+import logging
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.api.services.tracing import REQUEST_ID_HEADER, get_tracer, request_context
+
+logger = logging.getLogger(__name__)
+
+
+class BackendClient:
+    """Keep-alive session with timeouts, retries and per-call latency logging."""
+
+    def __init__(
+        self,
+        base_url: str,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 120.0,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        pool_size: int = 10
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        # Retry connection failures and 502s from a proxy that never reached
+        # the backend, but never re-send a request the backend may have worked
+        # on: generation is not free. 503/504 already come after the backend's
+        # own Gemini retries, or from an open circuit breaker whose Retry-After
+        # would block the Streamlit script, so they go straight to the user.
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502,),
+            allowed_methods=frozenset({"GET", "POST"}),
+            respect_retry_after_header=False,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        """POST to a backend path; for streamed calls latency is time to headers.
+
+        Each call gets a fresh ``X-Request-ID`` that the backend attaches to
+        its own spans, and is recorded as a ``frontend.post`` span whose W3C
+        ``traceparent`` makes it the parent of the backend's spans.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        with request_context() as request_id, get_tracer().span("frontend.post", path=path) as span:
+            kwargs["headers"] = {**kwargs.get("headers", {}), REQUEST_ID_HEADER: request_id}
+            get_tracer().inject(kwargs["headers"])
+            start = time.perf_counter()
+            try:
+                response = self.session.post(f"{self.base_url}{path}", **kwargs)
+            except requests.RequestException:
+                logger.warning(f"POST {path} [{request_id}] failed after {(time.perf_counter() - start) * 1000:.0f} ms")
+                raise
+            span.set_attribute("http.status_code", response.status_code)
+            logger.info(f"POST {path} [{request_id}] -> {response.status_code} in {(time.perf_counter() - start) * 1000:.0f} ms")
+            return response
+
+
+def create_backend_client(base_url: str) -> BackendClient:
+    """Create a BackendClient configured through BACKEND_* environment variables."""
+    return BackendClient(
+        base_url,
+        connect_timeout=float(os.getenv("BACKEND_CONNECT_TIMEOUT", "5")),
+        read_timeout=float(os.getenv("BACKEND_READ_TIMEOUT", "120")),
+        retries=int(os.getenv("BACKEND_RETRIES", "3")),
+        backoff_factor=float(os.getenv("BACKEND_RETRY_BACKOFF", "0.5")),
+        pool_size=int(os.getenv("BACKEND_POOL_SIZE", "10"))
+    )
@@ -0,0 +1,233 @@
+"""
+Offline load benchmark for the API routes, with Gemini replaced by a local stub.
+
+Requests are sent straight to the ASGI app, so no server or network access
+is needed and time to first byte is measured where the server emits it.
+
+Usage:
+    python -m benchmarks.api_benchmark --requests 200 --concurrency 16 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+SCENARIOS = ("generate", "generate_stream", "refine", "export_pdf", "export_docx", "export_txt")
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """Set the backend configuration before the app is imported."""
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark-stub-key")
+    # Every request is distinct, but keep caches out unless asked for
+    os.environ["LLM_CACHE_BACKEND"] = "memory" if args.cache else "none"
+    os.environ["STATE_BACKEND"] = "memory"
+    os.environ["EXPORT_PROCESS_WORKERS"] = str(args.export_workers)
+    os.environ.setdefault("TRACING", "none")
+    os.environ.setdefault("LLM_MAX_CONCURRENCY", str(max(args.concurrency, 16)))
+    # All benchmark requests come from one client; measure the routes, not the rate limiter
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+    os.environ.setdefault("ADMISSION_MAX_QUEUE", str(max(args.concurrency, 32)))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values``."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Return p50/p95/p99, mean and max in milliseconds."""
+    if not values:
+        return {}
+    return {
+        "p50": round(percentile(values, 50) * 1000, 3),
+        "p95": round(percentile(values, 95) * 1000, 3),
+        "p99": round(percentile(values, 99) * 1000, 3),
+        "mean": round(sum(values) / len(values) * 1000, 3),
+        "max": round(max(values) * 1000, 3),
+    }
+
+
+async def call_asgi(app, path: str, payload: Dict[str, object]) -> Tuple[int, float, float]:
+    """POST ``payload`` to the app and return status, time to first body byte and total time."""
+    body = json.dumps(payload).encode("utf-8")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("latin-1"),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"benchmark"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    start = time.perf_counter()
+    state = {"status": 0, "first_byte": None}
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Block like a connected client until the response is done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            state["status"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body") and state["first_byte"] is None:
+            state["first_byte"] = time.perf_counter() - start
+
+    await app(scope, receive, send)
+    total = time.perf_counter() - start
+    return state["status"], state["first_byte"] if state["first_byte"] is not None else total, total
+
+
+def build_request(scenario: str, index: int, args: argparse.Namespace, document: str) -> Tuple[str, Dict[str, object]]:
+    """Return the route and a distinct payload for request ``index`` of a scenario."""
+    base = {"doc_type": "Announcement", "tone": "Neutral"}
+    if scenario in ("generate", "generate_stream"):
+        path = "/api/documents/generate" if scenario == "generate" else "/api/documents/generate/stream"
+        return path, {**base, "prompt": f"Benchmark announcement #{index}", "language": "English"}
+    if scenario == "refine":
+        return "/api/documents/refine", {
+            **base,
+            "refinement_prompt": f"Make it shorter (#{index})",
+            "current_document": document,
+        }
+    format = scenario.split("_", 1)[1]
+    # A distinct suffix per request defeats the render cache unless --cache is given
+    content = document if args.cache else f"{document}\n\nRef. {index}"
+    return "/api/documents/export", {
+        "format": format,
+        "document_content": content,
+        "metadata": {"doc_type": "Announcement", "tone": "Neutral"},
+    }
+
+
+async def run_scenario(app, scenario: str, args: argparse.Namespace, document: str) -> Dict[str, object]:
+    """Send ``args.requests`` requests with ``args.concurrency`` in flight and summarize them."""
+    for index in range(args.warmup):
+        await call_asgi(app, *build_request(scenario, -1 - index, args, document))
+
+    next_index = 0
+    latencies: List[float] = []
+    ttfbs: List[float] = []
+    errors: Dict[str, int] = {}
+
+    async def worker():
+        nonlocal next_index
+        while next_index < args.requests:
+            index = next_index
+            next_index += 1
+            try:
+                status, ttfb, total = await call_asgi(app, *build_request(scenario, index, args, document))
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            if status >= 400:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+                continue
+            latencies.append(total)
+            ttfbs.append(ttfb)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": args.requests,
+        "succeeded": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_ms": summarize(latencies),
+        "ttfb_ms": summarize(ttfbs),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, object]:
+    from benchmarks.stub_model import StubGeminiModel, repeat_to_size
+    from app.api import main
+
+    document = repeat_to_size(main.get_test_response("Announcement", "Neutral"), args.response_chars)
+    stub = StubGeminiModel(
+        document,
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        chunk_tokens=args.chunk_tokens
+    )
+    main.get_llm_service().model = stub
+
+    results = {}
+    try:
+        for scenario in args.scenarios:
+            results[scenario] = await run_scenario(main.app, scenario, args, document)
+            print(
+                f"{scenario}: {results[scenario]['throughput_rps']} req/s, "
+                f"p50 {results[scenario]['latency_ms'].get('p50')} ms, "
+                f"p95 {results[scenario]['latency_ms'].get('p95')} ms",
+                file=sys.stderr
+            )
+    finally:
+        main.render_pool.shutdown()
+
+    return {
+        "benchmark": "api",
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "stub_latency_seconds": args.latency,
+            "stub_tokens_per_second": args.tokens_per_second,
+            "stub_chunk_tokens": args.chunk_tokens,
+            "response_chars": args.response_chars,
+            "cache": args.cache,
+            "export_process_workers": args.export_workers,
+        },
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "results": results,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the API against a stub Gemini model.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed requests per scenario")
+    parser.add_argument("--latency", type=float, default=0.3, help="stub seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="stub generation rate")
+    parser.add_argument("--chunk-tokens", type=int, default=20, help="tokens per streamed chunk")
+    parser.add_argument("--response-chars", type=int, default=2000, help="length of generated documents")
+    parser.add_argument("--export-workers", type=int, default=2, help="EXPORT_PROCESS_WORKERS for the run")
+    parser.add_argument("--cache", action="store_true", help="allow LLM and render cache hits")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    configure_environment(args)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Micro-benchmark for DocumentExporter across formats and document sizes.
+
+Each export is timed as render plus writing the file to disk, and peak
+Python memory is measured in a separate tracemalloc pass so tracing does
+not distort the timings.
+
+Usage:
+    python -m benchmarks.export_benchmark --output export_bench.json
+    python -m benchmarks.export_benchmark --sizes 1KB 100KB --compare export_bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from app.api.services.export_service import DocumentExporter
+
+FORMATS = ("pdf", "docx", "txt")
+DEFAULT_SIZES = ("1KB", "10KB", "100KB", "1MB")
+METADATA = {"doc_type": "Meeting Summary", "tone": "Formal"}
+
+_WORDS = (
+    "agenda committee faculty semester enrolment deadline examination lecture "
+    "research funding proposal budget approval department coordinator schedule "
+    "Prüfungsausschuss Fakultät Studierende Vorlesung Übung Raumänderung "
+    "discussion decision action review minutes attendance follow-up update"
+).split()
+
+
+def parse_size(size: str) -> int:
+    """Parse sizes such as ``512``, ``10KB`` or ``1MB`` into bytes."""
+    units = {"KB": 1024, "MB": 1024 * 1024}
+    for suffix, factor in units.items():
+        if size.upper().endswith(suffix):
+            return int(float(size[:-len(suffix)]) * factor)
+    return int(size)
+
+
+def synthetic_document(size: int, seed: int = 0) -> str:
+    """Build a meeting-summary-like document of about ``size`` UTF-8 bytes.
+
+    Headings, bullet points and paragraphs of varying length, generated from
+    a fixed seed so every run renders the same text.
+    """
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    item = 0
+    while length < size:
+        item += 1
+        block = [f"{item}. Agenda item: {' '.join(rng.choices(_WORDS, k=4)).capitalize()}"]
+        block += [f"- {' '.join(rng.choices(_WORDS, k=rng.randint(5, 14)))}" for _ in range(rng.randint(2, 5))]
+        block.append(" ".join(rng.choices(_WORDS, k=rng.randint(40, 120))).capitalize() + ".")
+        text = "\n".join(block) + "\n\n"
+        parts.append(text)
+        length += len(text.encode("utf-8"))
+    return "".join(parts).encode("utf-8")[:size].decode("utf-8", errors="ignore")
+
+
+def time_export(exporter: DocumentExporter, content: str, format: str) -> Dict[str, float]:
+    """Render and write one export; return timings in seconds and the output size."""
+    start = time.perf_counter()
+    data = exporter.render_uncached(content, METADATA, format)
+    rendered = time.perf_counter()
+    path = exporter.write_file(data, METADATA, format)
+    written = time.perf_counter()
+    os.remove(path)
+    return {"render": rendered - start, "write": written - rendered, "total": written - start, "bytes": len(data)}
+
+
+def peak_memory(exporter: DocumentExporter, content: str, format: str) -> int:
+    """Peak bytes allocated by Python while rendering and writing one export."""
+    tracemalloc.start()
+    try:
+        time_export(exporter, content, format)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def _ms(values: List[float]) -> Dict[str, float]:
+    return {
+        "median": round(statistics.median(values) * 1000, 3),
+        "min": round(min(values) * 1000, 3),
+        "max": round(max(values) * 1000, 3),
+    }
+
+
+def benchmark(formats: List[str], sizes: List[str], repeat: int, seed: int) -> List[Dict[str, object]]:
+    """Run every format/size combination and return one result row per pair."""
+    exporter = DocumentExporter()
+    results = []
+    for size_label in sizes:
+        size = parse_size(size_label)
+        content = synthetic_document(size, seed)
+        for format in formats:
+            # Untimed first run loads the renderer's modules and fonts
+            time_export(exporter, content, format)
+            runs = [time_export(exporter, content, format) for _ in range(repeat)]
+            row = {
+                "format": format,
+                "size": size_label,
+                "input_bytes": len(content.encode("utf-8")),
+                "output_bytes": runs[-1]["bytes"],
+                "render_ms": _ms([r["render"] for r in runs]),
+                "write_ms": _ms([r["write"] for r in runs]),
+                "total_ms": _ms([r["total"] for r in runs]),
+                "peak_memory_bytes": peak_memory(exporter, content, format),
+            }
+            results.append(row)
+            print(
+                f"{format:>4} {size_label:>6}: total {row['total_ms']['median']} ms, "
+                f"peak {row['peak_memory_bytes'] / 1024:.0f} KiB",
+                file=sys.stderr
+            )
+    exporter.executor.shutdown()
+    return results
+
+
+def compare(results: List[Dict[str, object]], baseline_path: str) -> List[Dict[str, object]]:
+    """Return per-row ratios (current / baseline) for median total time and peak memory."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["format"], r["size"]): r for r in json.load(f)["results"]}
+    rows = []
+    for row in results:
+        base = baseline.get((row["format"], row["size"]))
+        if base is None:
+            continue
+        rows.append({
+            "format": row["format"],
+            "size": row["size"],
+            "total_ms_ratio": round(row["total_ms"]["median"] / base["total_ms"]["median"], 3) if base["total_ms"]["median"] else None,
+            "peak_memory_ratio": round(row["peak_memory_bytes"] / base["peak_memory_bytes"], 3) if base["peak_memory_bytes"] else None,
+        })
+    return rows
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark document export by format and size.")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--sizes", nargs="+", default=list(DEFAULT_SIZES), help="e.g. 1KB 10KB 100KB 1MB")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per format and size")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic documents")
+    parser.add_argument("--compare", help="earlier JSON report to compute ratios against")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    results = benchmark(args.formats, args.sizes, args.repeat, args.seed)
+    report = {
+        "benchmark": "export",
+        "config": {"formats": args.formats, "sizes": args.sizes, "repeat": args.repeat, "seed": args.seed},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "results": results,
+    }
+    if args.compare:
+        report["comparison"] = {"baseline": args.compare, "rows": compare(results, args.compare)}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Deterministic stand-in for ``google.generativeai.GenerativeModel`` used by the benchmarks.
+"""
+import asyncio
+import math
+from typing import AsyncIterator, List, Optional
+
+from app.api.services.prompt_budget import CHARS_PER_TOKEN, estimate_tokens
+
+
+class StubUsage:
+    """Token counts in the shape of Gemini's ``usage_metadata``."""
+
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.cached_content_token_count = 0
+
+
+class StubResponse:
+    """A (partial) model response with ``text`` and optional usage metadata."""
+
+    def __init__(self, text: str, usage_metadata: Optional[StubUsage] = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class StubGeminiModel:
+    """Returns a fixed text with simulated network latency and token rate.
+
+    A call waits ``latency`` seconds before the first token, then produces
+    ``tokens_per_second`` tokens per second, streamed ``chunk_tokens`` at a
+    time. The same prompt always yields the same output, so runs are
+    comparable.
+    """
+
+    def __init__(
+        self,
+        response_text: str,
+        latency: float = 0.3,
+        tokens_per_second: float = 200.0,
+        chunk_tokens: int = 20
+    ):
+        self.response_text = response_text
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = chunk_tokens
+        self.calls = 0
+
+    def _chunks(self) -> List[str]:
+        size = self.chunk_tokens * CHARS_PER_TOKEN
+        return [self.response_text[i:i + size] for i in range(0, len(self.response_text), size)]
+
+    def _generation_seconds(self, text: str) -> float:
+        return estimate_tokens(text) / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _usage(self, prompt: str) -> StubUsage:
+        return StubUsage(estimate_tokens(prompt), estimate_tokens(self.response_text))
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        """Return the full response, or an async iterator of chunks with ``stream=True``."""
+        self.calls += 1
+        if stream:
+            return self._stream(prompt)
+        await asyncio.sleep(self.latency + self._generation_seconds(self.response_text))
+        return StubResponse(self.response_text, self._usage(prompt))
+
+    async def _stream(self, prompt: str) -> AsyncIterator[StubResponse]:
+        await asyncio.sleep(self.latency)
+        chunks = self._chunks()
+        for index, chunk in enumerate(chunks):
+            await asyncio.sleep(self._generation_seconds(chunk))
+            last = index == len(chunks) - 1
+            yield StubResponse(chunk, self._usage(prompt) if last else None)
+
+
+def repeat_to_size(text: str, size: int) -> str:
+    """Repeat ``text`` until it is ``size`` characters long."""
+    return (text * math.ceil(size / max(len(text), 1)))[:size]
@@ -0,0 +1,25 @@
+"""
+Gunicorn settings for the production backend (./run.sh prod).
+
+Each worker is a separate process with its own caches, so run with
+STATE_BACKEND=sqlite (one host) or STATE_BACKEND=redis (several hosts) to
+share sessions and cached responses between workers.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Streams can run for a while; give in-flight requests time to finish on
+# restart (SIGHUP) or shutdown (SIGTERM) before workers are killed
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Recycle workers periodically, staggered so they never all restart at once
+max_requests = int(os.getenv("MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "100"))
+
+accesslog = "-"
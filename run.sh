@@ -11,6 +11,16 @@ run_backend() {
     uvicorn app.api.main:app --reload
 }
 
+run_backend_prod() {
+    echo "Starting backend server (production, ${WEB_CONCURRENCY:-auto} workers)..."
+    cd "$PROJECT_DIR"
+    if [ "${WEB_CONCURRENCY:-0}" != "1" ] && [ -z "$STATE_BACKEND" ]; then
+        # Several workers must share sessions and caches
+        export STATE_BACKEND=sqlite
+    fi
+    exec gunicorn app.api.main:app -c gunicorn.conf.py
+}
+
 run_frontend() {
     echo "Starting frontend server..."
     cd "$PROJECT_DIR"
@@ -31,6 +41,8 @@ fi
 # Run based on input
 if [ "$1" == "backend" ]; then
     run_backend
+elif [ "$1" == "prod" ]; then
+    run_backend_prod
 elif [ "$1" == "frontend" ]; then
     run_frontend
 else
@@ -6,9 +6,10 @@ import base64
 from datetime import datetime
 import json
 from typing import Dict, Any
-import time
 from app.api.models.document import DocumentType, ToneType
+from app.web.utils.backend_client import BackendClient, create_backend_client
 import io
+import uuid
 
 # Configure the page
 st.set_page_config(
@@ -335,15 +336,134 @@ if "exported_file_name" not in st.session_state:
     st.session_state.exported_file_name = None
 if "exported_file_mime" not in st.session_state:
     st.session_state.exported_file_mime = None
+if "session_id" not in st.session_state:
+    st.session_state.session_id = None
+if "client_id" not in st.session_state:
+    # Lets the backend rate-limit each browser session instead of this whole server
+    st.session_state.client_id = uuid.uuid4().hex
 
 # Backend URL
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
-def generate_document(doc_type: str, tone: str, prompt: str, additional_context: str = "", sender_name: str = "", sender_profession: str = "", language: str = "English"):
+@st.cache_resource
+def get_backend_client() -> BackendClient:
     """
-    Generate a document using the LLM service.
+    Return the pooled backend client shared by all sessions of this Streamlit server.
 
     Args:
+        None
+
+    Return:
+        BackendClient: The shared client.
+    """
+    return create_backend_client(BACKEND_URL)
+
+def client_headers() -> Dict[str, str]:
+    """
+    Return the headers identifying this browser session to the backend's rate limiter.
+
+    Args:
+        None
+
+    Return:
+        dict: The X-Client-ID header.
+    """
+    return {"X-Client-ID": st.session_state.client_id}
+
+def get_session_id():
+    """
+    Return the backend session ID for this browser session, creating it on first use.
+
+    Args:
+        None
+
+    Return:
+        str or None: The session ID, or None if the backend could not create one.
+    """
+    if st.session_state.session_id is None:
+        try:
+            response = get_backend_client().post("/api/sessions")
+            response.raise_for_status()
+            st.session_state.session_id = response.json()["session_id"]
+        except Exception:
+            return None
+    return st.session_state.session_id
+
+def stream_document_chunks(endpoint: str, payload: Dict[str, Any]):
+    """
+    Yield decoded SSE chunks from a streaming backend endpoint as they arrive.
+
+    Args:
+        endpoint (str): The backend path, e.g. '/api/documents/generate/stream'.
+        payload (dict): The JSON body to send.
+
+    Return:
+        generator: Yields chunk dicts with 'document' and 'metadata' keys.
+    """
+    response = get_backend_client().post(endpoint, json=payload, headers=client_headers(), stream=True)
+    response.raise_for_status()
+    for line in response.iter_lines():
+        if not line:
+            continue
+        try:
+            yield json.loads(line.decode().replace('data: ', '', 1))
+        except ValueError:
+            continue
+
+def render_assistant_message(placeholder, text: str):
+    """
+    Render (or re-render) an assistant chat bubble into a placeholder.
+
+    Args:
+        placeholder: The Streamlit placeholder to draw into.
+        text (str): The message text rendered so far.
+
+    Return:
+        None.
+    """
+    placeholder.markdown(f"""
+    <div class=\"chat-message assistant\">\n<div class=\"content\">\n<div class=\"avatar\">🤖</div>\n<div class=\"message\">{text}</div>\n</div>\n</div>\n""", unsafe_allow_html=True)
+
+def consume_document_stream(placeholder, endpoint: str, payload: Dict[str, Any]):
+    """
+    Render a streamed document into the placeholder chunk by chunk.
+
+    A stream that ends without its completion event (idle timeout, dropped
+    connection) is an error: the partial text is cleared rather than kept
+    as a new version, so the caller keeps the previous document.
+
+    Args:
+        placeholder: The Streamlit placeholder to render into.
+        endpoint (str): The streaming backend path.
+        payload (dict): The JSON body to send.
+
+    Return:
+        dict or None: The complete 'document' and its 'version_id' (if stored), or None if nothing was streamed.
+    """
+    full_response = ""
+    version_id = None
+    complete = False
+    try:
+        for chunk in stream_document_chunks(endpoint, payload):
+            full_response += chunk["document"]
+            version_id = chunk.get("version_id", version_id)
+            complete = complete or bool(chunk.get("metadata", {}).get("is_complete"))
+            render_assistant_message(placeholder, full_response)
+        if not complete:
+            raise RuntimeError("The response ended before it was complete; the previous version was kept")
+    except Exception:
+        placeholder.empty()
+        raise
+    if not full_response:
+        return None
+    return {"document": full_response, "version_id": version_id}
+
+def generate_document_stream(placeholder, doc_type: str, tone: str, prompt: str, additional_context: str = "", sender_name: str = "", sender_profession: str = "", language: str = "English"):
+    """
+    Generate a document and render it into the placeholder while it streams in.
+
+    Args:
+        placeholder: The Streamlit placeholder to render the document into.
         doc_type (str): The type of document to generate.
         tone (str): The tone to use in the document.
         prompt (str): The main prompt or key points for the document.
@@ -353,23 +473,20 @@ def generate_document(doc_type: str, tone: str, prompt: str, additional_context:
         language (str, optional): The language of the email. Defaults to "English".
 
     Return:
-        dict or None: The response from the backend API, or None if an error occurs.
+        dict or None: The complete 'document' and its server-side 'version_id', or None if an error occurs.
     """
+    payload = {
+        "doc_type": doc_type,
+        "tone": tone,
+        "prompt": prompt,
+        "additional_context": additional_context,
+        "sender_name": sender_name,
+        "sender_profession": sender_profession,
+        "language": language,
+        "session_id": get_session_id()
+    }
     try:
-        response = requests.post(
-            f"{BACKEND_URL}/api/documents/generate",
-            json={
-                "doc_type": doc_type,
-                "tone": tone,
-                "prompt": prompt,
-                "additional_context": additional_context,
-                "sender_name": sender_name,
-                "sender_profession": sender_profession,
-                "language": language
-            }
-        )
-        response.raise_for_status()
-        return response.json()
+        return consume_document_stream(placeholder, "/api/documents/generate/stream", payload)
     except Exception as e:
         st.error(f"Error generating document: {str(e)}")
         return None
@@ -389,8 +506,8 @@ def export_document_and_prepare_download(document, format, doc_type, tone):
     """
     metadata = {"doc_type": doc_type or "Document", "tone": tone or "Neutral"}
     try:
-        response = requests.post(
-            f"{BACKEND_URL}/api/documents/export",
+        response = get_backend_client().post(
+            "/api/documents/export",
             json={
                 "document_content": document,
                 "format": format,
@@ -415,21 +532,6 @@ def export_document_and_prepare_download(document, format, doc_type, tone):
         st.session_state.exported_file_name = None
         st.session_state.exported_file_mime = None
 
-def simulate_streaming(text: str, chunk_size: int = 10):
-    """
-    Simulate streaming text by yielding chunks.
-
-    Args:
-        text (str): The text to stream.
-        chunk_size (int, optional): The size of each chunk. Defaults to 10.
-
-    Return:
-        generator: Yields chunks of the text.
-    """
-    for i in range(0, len(text), chunk_size):
-        yield text[i:i + chunk_size]
-        time.sleep(0.02)  # Small delay for smooth animation
-
 # Document Preview Modal state
 if "show_preview" not in st.session_state:
     st.session_state.show_preview = False
@@ -478,8 +580,8 @@ def get_exported_file_bytes(document, format, doc_type, tone):
     """
     metadata = {"doc_type": doc_type or "Document", "tone": tone or "Neutral"}
     try:
-        response = requests.post(
-            f"{BACKEND_URL}/api/documents/export",
+        response = get_backend_client().post(
+            "/api/documents/export",
             json={
                 "document_content": document,
                 "format": format,
@@ -492,45 +594,89 @@ def get_exported_file_bytes(document, format, doc_type, tone):
         st.error(f"Error exporting document: {str(e)}")
         return None
 
-def refine_document(current_document: str, refinement_prompt: str, doc_type: str, tone: str, history=None):
+HISTORY_EXPORT_FORMATS = {
+    "pdf": ("📑 PDF", "application/pdf"),
+    "docx": ("📘 DOCX", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+}
+
+def render_history_download(doc, format, idx):
+    """
+    Render an on-demand export control for a document history entry.
+
+    The backend is only called once the user asks for a format; the bytes are
+    then kept on the history entry so later reruns render the download button
+    without another export request.
+
+    Args:
+        doc (dict): The history entry from st.session_state.document_history.
+        format (str): The export format ('pdf' or 'docx').
+        idx (int): The position of the entry in the rendered history list.
+
+    Return:
+        None.
+    """
+    label, mime = HISTORY_EXPORT_FORMATS[format]
+    exports = doc.setdefault("exports", {})
+    if format not in exports:
+        if not st.button(label, key=f"prepare_{format}_{idx}", help=f"Prepare {format.upper()} export"):
+            return
+        file_bytes = get_exported_file_bytes(doc['content'], format, doc.get('type'), doc.get('tone'))
+        if not file_bytes:
+            return
+        exports[format] = file_bytes
+    st.download_button(
+        label=f"📥 {format.upper()}",
+        data=exports[format],
+        file_name=f"TUM_{doc.get('type', 'Document')}_{doc.get('tone', 'Neutral')}.{format}",
+        mime=mime,
+        key=f"download_{format}_{idx}"
+    )
+
+def refine_document(placeholder, last_doc: Dict[str, Any], refinement_prompt: str, doc_type: str, tone: str, history=None, patch_mode: bool = False):
     """
-    Refine a document using the LLM service, with up to the last 3 documents as history.
+    Refine a document using the LLM service, rendering the refined text into the
+    placeholder as it streams in.
+
+    When the document is stored in the backend session it is referenced by
+    version ID and the backend supplies the history window; otherwise the
+    document and up to the last 3 history entries are sent inline.
 
     Args:
-        current_document (str): The document to be refined.
+        placeholder: The Streamlit placeholder to render the refined document into.
+        last_doc (dict): The history entry being refined.
         refinement_prompt (str): The user's instruction for refinement.
         doc_type (str): The type of document.
         tone (str): The tone to use in the document.
-        history (list, optional): List of previous document contents for context. Defaults to None.
+        history (list, optional): Previous document contents, used only for inline requests. Defaults to None.
+        patch_mode (bool, optional): Ask the backend for targeted edits instead of a full rewrite. Defaults to False.
 
     Return:
-        str or None: The refined document as a string, or None if an error occurs.
+        dict or None: The refined 'document' and its 'version_id', or None if an error occurs.
     """
+    payload = {
+        "refinement_prompt": refinement_prompt,
+        "doc_type": doc_type,
+        "tone": tone,
+        "mode": "patch" if patch_mode else "rewrite"
+    }
+    inline = {"current_document": last_doc["content"], "history": (history or [])[-3:]}
+    session_id = get_session_id()
     try:
-        payload = {
-            "current_document": current_document,
-            "refinement_prompt": refinement_prompt,
-            "doc_type": doc_type,
-            "tone": tone
-        }
-        if history:
-            payload["history"] = history
-        response = requests.post(
-            f"{BACKEND_URL}/api/documents/refine",
-            json=payload,
-            stream=True
-        )
-        response.raise_for_status()
-        # Stream the response
-        full_response = ""
-        for line in response.iter_lines():
-            if line:
-                try:
-                    chunk = json.loads(line.decode().replace('data: ', ''))
-                    full_response += chunk["document"]
-                except Exception:
-                    continue
-        return full_response
+        if session_id and last_doc.get("version_id"):
+            try:
+                return consume_document_stream(
+                    placeholder, "/api/documents/refine",
+                    {**payload, "session_id": session_id, "version_id": last_doc["version_id"]}
+                )
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                # Session expired on the backend; start a new one from the inline document
+                st.session_state.session_id = None
+                session_id = get_session_id()
+        if session_id:
+            return consume_document_stream(placeholder, "/api/documents/refine", {**payload, **inline, "session_id": session_id})
+        return consume_document_stream(placeholder, "/api/documents/refine", {**payload, **inline})
     except Exception as e:
         st.error(f"Error refining document: {str(e)}")
         return None
@@ -554,6 +700,7 @@ with st.sidebar:
     sender_name = st.text_input("Sender Name", value="")
     sender_profession = st.text_input("Sender Profession", value="")
     language = st.selectbox("Language", options=["English", "German", "Both"], index=0)
+    patch_mode = st.checkbox("⚡ Quick edits", value=False, help="Apply small refinements as targeted edits instead of rewriting the whole document")
     
     st.markdown("---")
     st.markdown("### 📜 Document History")
@@ -580,25 +727,9 @@ with st.sidebar:
             if st.button("👁️ Preview", key=f"preview_{idx}", on_click=open_preview, args=(idx,)):
                 pass
         with col2:
-            file_bytes = get_exported_file_bytes(doc['content'], 'pdf', doc.get('type'), doc.get('tone'))
-            if file_bytes:
-                st.download_button(
-                    label="📑 PDF",
-                    data=file_bytes,
-                    file_name=f"TUM_{doc.get('type', 'Document')}_{doc.get('tone', 'Neutral')}.pdf",
-                    mime="application/pdf",
-                    key=f"download_pdf_{idx}"
-                )
+            render_history_download(doc, 'pdf', idx)
         with col3:
-            file_bytes = get_exported_file_bytes(doc['content'], 'docx', doc.get('type'), doc.get('tone'))
-            if file_bytes:
-                st.download_button(
-                    label="📘 DOCX",
-                    data=file_bytes,
-                    file_name=f"TUM_{doc.get('type', 'Document')}_{doc.get('tone', 'Neutral')}.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    key=f"download_docx_{idx}"
-                )
+            render_history_download(doc, 'docx', idx)
         st.markdown("</div></div>", unsafe_allow_html=True)
 
 # Show download button if a file is ready
@@ -668,40 +799,31 @@ with st.container():
                     last_doc = st.session_state.document_history[-1]
                     doc_type_val = last_doc.get("type", doc_type)
                     tone_val = last_doc.get("tone", tone)
-                    # Send the full document history for context
-                    history_docs = [d["content"] for d in st.session_state.document_history]
-                    refined = refine_document(last_doc["content"], prompt, doc_type_val, tone_val, history=history_docs)
+                    history_docs = [d["content"] for d in st.session_state.document_history[:-1]]
+                    message_placeholder = st.empty()
+                    refined = refine_document(message_placeholder, last_doc, prompt, doc_type_val, tone_val, history=history_docs, patch_mode=patch_mode)
                     if refined:
-                        message_placeholder = st.empty()
-                        full_response = ""
-                        for chunk in simulate_streaming(refined):
-                            full_response += chunk
-                            message_placeholder.markdown(f"""
-                            <div class=\"chat-message assistant\">\n<div class=\"content\">\n<div class=\"avatar\">🤖</div>\n<div class=\"message\">{full_response}</div>\n</div>\n</div>\n""", unsafe_allow_html=True)
-                        st.session_state.current_document = refined
-                        st.session_state.messages.append({"role": "assistant", "content": refined})
+                        st.session_state.current_document = refined["document"]
+                        st.session_state.messages.append({"role": "assistant", "content": refined["document"]})
                         st.session_state.document_history.append({
                             "type": doc_type_val,
                             "tone": tone_val,
-                            "content": refined,
+                            "content": refined["document"],
+                            "version_id": refined["version_id"],
                             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                         })
                 else:
                     # No previous document, generate new
-                    result = generate_document(doc_type, tone, prompt, sender_name=sender_name, sender_profession=sender_profession, language=language)
-                    if result:
-                        message_placeholder = st.empty()
-                        full_response = ""
-                        for chunk in simulate_streaming(result["document"]):
-                            full_response += chunk
-                            message_placeholder.markdown(f"""
-                            <div class=\"chat-message assistant\">\n<div class=\"content\">\n<div class=\"avatar\">🤖</div>\n<div class=\"message\">{full_response}</div>\n</div>\n</div>\n""", unsafe_allow_html=True)
-                        st.session_state.current_document = result["document"]
-                        st.session_state.messages.append({"role": "assistant", "content": result["document"]})
+                    message_placeholder = st.empty()
+                    generated = generate_document_stream(message_placeholder, doc_type, tone, prompt, sender_name=sender_name, sender_profession=sender_profession, language=language)
+                    if generated:
+                        st.session_state.current_document = generated["document"]
+                        st.session_state.messages.append({"role": "assistant", "content": generated["document"]})
                         st.session_state.document_history.append({
                             "type": doc_type,
                             "tone": tone,
-                            "content": result["document"],
+                            "content": generated["document"],
+                            "version_id": generated["version_id"],
                             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                         })
             st.session_state.is_generating = False
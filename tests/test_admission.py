@@ -0,0 +1,196 @@
+import asyncio
+import gc
+
+import pytest
+
+from app.api.services.admission import AdmissionController, AdmissionRejected, RateLimiter, TokenBucket
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_token_bucket_reports_wait_until_tokens_refill():
+    bucket = TokenBucket(rate=1.0, burst=2)
+    assert bucket.take() == 0.0
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(1.0, abs=0.05)
+
+
+def test_rate_limiter_keeps_clients_apart_and_charges_full_cost():
+    limiter = RateLimiter(per_minute=60, burst=3)
+    assert limiter.take("a", cost=3) == 0.0
+    assert limiter.take("a") > 0
+    assert limiter.take("b") == 0.0
+    # A cost above the burst is never capped down to it
+    assert limiter.take("c", cost=4) > 0
+
+
+def test_rate_limiter_forgets_least_recently_seen_clients():
+    limiter = RateLimiter(per_minute=60, burst=1, max_clients=2)
+    limiter.take("a")
+    limiter.take("b")
+    limiter.take("c")
+    # "a" was evicted, so it starts again with a full bucket
+    assert limiter.take("a") == 0.0
+    assert limiter.take("c") > 0
+
+
+def test_rate_limited_requests_are_rejected():
+    async def scenario():
+        controller = AdmissionController(rate_limiter=RateLimiter(per_minute=60, burst=1))
+        (await controller.acquire("client", "generate")).release()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("client", "generate")
+        assert rejected.value.reason == "rate_limited"
+        assert rejected.value.retry_after > 0
+        assert controller.stats()["rejected"] == {"rate_limited": 1}
+
+    run(scenario())
+
+
+def test_requests_queue_for_a_slot_and_are_admitted_on_release():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=1.0)
+        held = await controller.acquire("a", "generate")
+        waiter = asyncio.create_task(controller.acquire("b", "generate"))
+        await asyncio.sleep(0.01)
+        assert controller.stats()["queued"] == 1
+        held.release()
+        slot = await waiter
+        assert slot.queue_wait > 0
+        assert controller.stats()["in_flight"] == 1
+        slot.release()
+        assert controller.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_full_queue_is_rejected_at_once():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=1.0)
+        held = await controller.acquire("a", "generate")
+        waiter = asyncio.create_task(controller.acquire("b", "generate"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("c", "generate")
+        assert rejected.value.reason == "queue_full"
+        held.release()
+        (await waiter).release()
+
+    run(scenario())
+
+
+def test_queue_wait_is_bounded_by_the_timeout():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=0.05)
+        held = await controller.acquire("a", "generate")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("b", "generate")
+        assert rejected.value.reason == "queue_timeout"
+        assert controller.stats()["queued"] == 0
+        held.release()
+
+    run(scenario())
+
+
+def test_release_is_idempotent():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, queue_timeout=0.05)
+        slot = await controller.acquire("a", "generate")
+        slot.release()
+        slot.release()
+        assert controller.stats()["in_flight"] == 0
+        # Only one slot was returned, so a second concurrent request must wait
+        await controller.acquire("b", "generate")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("c", "generate")
+        assert rejected.value.reason == "queue_timeout"
+
+    run(scenario())
+
+
+def test_acquire_slot_does_not_charge_the_rate_limit():
+    async def scenario():
+        controller = AdmissionController(rate_limiter=RateLimiter(per_minute=60, burst=2))
+        controller.charge("client", "generate_batch", cost=2)
+        for _ in range(3):
+            (await controller.acquire_slot("generate_batch")).release()
+        with pytest.raises(AdmissionRejected):
+            controller.charge("client", "generate_batch")
+
+    run(scenario())
+
+
+async def events(count, started=None):
+    if started is not None:
+        started.set()
+    for index in range(count):
+        await asyncio.sleep(0)
+        yield index
+
+
+def test_held_stream_releases_its_slot_when_finished():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1)
+        slot = await controller.acquire("a", "generate")
+        assert [event async for event in slot.hold(events(3))] == [0, 1, 2]
+        assert controller.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_held_stream_releases_its_slot_when_closed_early():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1)
+        slot = await controller.acquire("a", "generate")
+        stream = slot.hold(events(10))
+        await stream.__anext__()
+        assert controller.stats()["in_flight"] == 1
+        await stream.aclose()
+        assert controller.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_unstarted_stream_releases_its_slot_when_dropped():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1)
+        slot = await controller.acquire("a", "generate")
+        stream = slot.hold(events(10))
+        del stream
+        gc.collect()
+        assert controller.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_requests_rejected_for_capacity_are_refunded():
+    async def scenario():
+        controller = AdmissionController(
+            max_concurrency=1, max_queue=0, rate_limiter=RateLimiter(per_minute=60, burst=2)
+        )
+        held = await controller.acquire("a", "generate")
+        for _ in range(3):
+            with pytest.raises(AdmissionRejected) as rejected:
+                await controller.acquire("a", "generate")
+            assert rejected.value.reason == "queue_full"
+        held.release()
+        # Only the served request was charged
+        (await controller.acquire("a", "generate")).release()
+
+    run(scenario())
+
+
+def test_slot_refund_returns_the_charge_once():
+    async def scenario():
+        controller = AdmissionController(rate_limiter=RateLimiter(per_minute=60, burst=1))
+        slot = await controller.acquire("a", "generate")
+        slot.release()
+        slot.refund()
+        slot.refund()
+        (await controller.acquire("a", "generate")).release()
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("a", "generate")
+
+    run(scenario())
@@ -0,0 +1,53 @@
+import time
+
+from app.api.services.cache_service import MemoryCache, SQLiteCache, create_state_backend
+
+
+def test_sqlite_cache_is_trimmed_to_max_size_least_recently_written_first(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_size=3, purge_every=1)
+    for key in "abcd":
+        cache.set(key, key)
+    # Rewriting "b" makes it the newest entry, so "c" is the oldest now
+    cache.set("b", "b2")
+    cache.set("e", "e")
+    assert len(cache) == 3
+    assert [cache.get(key) for key in "abcde"] == [None, "b2", None, "d", "e"]
+
+
+def test_sqlite_cache_purges_expired_rows_periodically(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl=0.05, purge_every=4)
+    for key in "abc":
+        cache.set(key, key)
+    time.sleep(0.1)
+    assert len(cache) == 3
+    # The fourth write triggers a purge of the expired rows
+    cache.set("d", "d")
+    assert len(cache) == 1
+    assert cache.get("d") == "d"
+
+
+def test_sqlite_cache_purges_on_open(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteCache(path, max_size=10)
+    for key in "abcde":
+        cache.set(key, key)
+    reopened = SQLiteCache(path, max_size=2)
+    assert len(reopened) == 2
+    assert reopened.get("e") == "e"
+    assert cache.get("a") is None
+
+
+def test_expired_entries_are_misses():
+    cache = MemoryCache(ttl=0.05)
+    cache.set("a", "value")
+    assert cache.get("a") == "value"
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_state_backend_passes_max_size_to_sqlite(tmp_path):
+    backend = create_state_backend("sessions", "sqlite", max_size=7, path=str(tmp_path / "state.sqlite3"))
+    assert isinstance(backend, SQLiteCache)
+    assert backend.max_size == 7
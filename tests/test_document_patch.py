@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from app.api.services.document_patch import PatchError, apply_edits, parse_edits, patch_document
+
+DOCUMENT = "Dear Students,\n\nThe exam is on March 15.\nRegistration closes on March 10.\n\nBest regards"
+
+
+def test_apply_edits_replaces_each_find_in_order():
+    edits = [
+        {"find": "March 15", "replace": "March 22"},
+        {"find": "March 22.", "replace": "March 22 in room 1200."},
+    ]
+    assert apply_edits(DOCUMENT, edits) == DOCUMENT.replace("March 15.", "March 22 in room 1200.")
+
+
+def test_apply_edits_rejects_missing_find():
+    with pytest.raises(PatchError, match="not found"):
+        apply_edits(DOCUMENT, [{"find": "April 1", "replace": "April 2"}])
+
+
+def test_apply_edits_rejects_ambiguous_find():
+    with pytest.raises(PatchError, match="occurs 2 times"):
+        apply_edits(DOCUMENT, [{"find": "March", "replace": "April"}])
+
+
+def test_ambiguity_is_checked_against_the_partially_patched_document():
+    edits = [
+        {"find": "March 10", "replace": "March 15"},
+        {"find": "March 15", "replace": "March 22"},
+    ]
+    with pytest.raises(PatchError, match="occurs 2 times"):
+        apply_edits(DOCUMENT, edits)
+
+
+def test_parse_edits_accepts_fenced_json_and_bare_lists():
+    edits = [{"find": "exam", "replace": "final exam"}]
+    assert parse_edits("```json\n" + json.dumps({"edits": edits}) + "\n```") == edits
+    assert parse_edits(json.dumps(edits)) == edits
+
+
+@pytest.mark.parametrize("text", [
+    "not json",
+    '{"edits": null}',
+    '{"edits": []}',
+    '{"edits": [{"find": "exam"}]}',
+    '{"edits": [{"find": "", "replace": "x"}]}',
+])
+def test_parse_edits_rejects_unusable_edit_lists(text):
+    with pytest.raises(PatchError):
+        parse_edits(text)
+
+
+def test_patch_document_returns_patched_text_edits_and_diff():
+    patched, edits, diff = patch_document(DOCUMENT, json.dumps({"edits": [{"find": "March 15", "replace": "March 22"}]}))
+    assert "March 22" in patched
+    assert edits == [{"find": "March 15", "replace": "March 22"}]
+    assert "-The exam is on March 15." in diff
+    assert "+The exam is on March 22." in diff
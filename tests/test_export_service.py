@@ -0,0 +1,84 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+from pydantic import ValidationError
+
+from app.api.models.document import BulkExportRequest, ExportFormat
+from app.api.services.export_service import DocumentExporter, content_disposition, safe_name
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def collect(stream) -> bytes:
+    async def scenario():
+        return b"".join([chunk async for chunk in stream])
+
+    return run(scenario())
+
+
+def test_safe_name_cannot_escape_the_archive():
+    assert safe_name("Meeting Summary") == "meeting_summary"
+    assert safe_name("../../evil") == "evil"
+    assert safe_name("..\\x/y") == "x_y"
+    assert safe_name("../") == "document"
+
+
+def test_zip_entry_names_are_sanitized():
+    exporter = DocumentExporter()
+    documents = [("Hello", {"doc_type": "../../evil"}), ("Hi", {"doc_type": "Announcement"})]
+    archive = zipfile.ZipFile(io.BytesIO(collect(exporter.export_zip_stream(documents, ["txt"]))))
+    assert sorted(archive.namelist()) == ["0001_TUM_evil.txt", "0002_TUM_announcement.txt"]
+    assert archive.read("0002_TUM_announcement.txt").decode().endswith("Hi")
+
+
+def test_zip_stream_reports_failed_entries_and_bounds_renders_in_flight():
+    exporter = DocumentExporter()
+    exporter.zip_window = 2
+    in_flight = []
+    peak = []
+
+    async def render(content, metadata, format):
+        in_flight.append(content)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(content)
+        if content == "bad":
+            raise ValueError("cannot render")
+        return content.encode()
+
+    documents = [(str(i), {}) for i in range(6)] + [("bad", {})]
+    stream = exporter.export_zip_stream(documents, ["txt", "pdf"], render=render)
+    archive = zipfile.ZipFile(io.BytesIO(collect(stream)))
+    assert max(peak) == 2
+    assert len(archive.namelist()) == 13
+    assert archive.read("errors.txt").decode().count("cannot render") == 2
+    # Text is deflated; PDF and DOCX are already compressed and stored as is
+    assert archive.getinfo("0001_TUM_document.txt").compress_type == zipfile.ZIP_DEFLATED
+    assert archive.getinfo("0001_TUM_document.pdf").compress_type == zipfile.ZIP_STORED
+
+
+def test_bulk_export_request_drops_repeated_formats():
+    request = BulkExportRequest(documents=[{"document_content": "x"}], formats=["pdf", "pdf", "txt"])
+    assert request.formats == [ExportFormat.PDF, ExportFormat.TXT]
+    with pytest.raises(ValidationError):
+        BulkExportRequest(documents=[{"document_content": "x"}], formats=[])
+
+
+def test_download_filenames_keep_letters_and_drop_header_breaking_characters():
+    exporter = DocumentExporter()
+    name = exporter.download_filename({"doc_type": 'Ankündigung "x"\r\nSet-Cookie: a=b'}, "pdf")
+    assert name.startswith("TUM_ankündigung_x_set-cookie_a_b_")
+    assert name.endswith(".pdf")
+
+
+def test_content_disposition_uses_rfc_5987_for_non_ascii_names():
+    assert content_disposition("TUM_announcement.pdf") == 'attachment; filename="TUM_announcement.pdf"'
+    header = content_disposition("TUM_ankündigung.pdf")
+    assert header == "attachment; filename*=utf-8''TUM_ank%C3%BCndigung.pdf"
+    # Starlette encodes header values as latin-1
+    header.encode("latin-1")
+    content_disposition("TUM_通知.txt").encode("latin-1")
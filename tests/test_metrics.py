@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from app.api.services.metrics import ERRORS, MetricsMiddleware, MetricsRegistry
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_callback_metrics_are_read_at_scrape_time():
+    registry = MetricsRegistry()
+    hits = {"export": 1}
+    registry.callback("cache_hits_total", "Cache hits.", ("cache",), "counter", lambda: {(k,): v for k, v in hits.items()})
+    assert 'cache_hits_total{cache="export"} 1' in registry.render()
+    hits["export"] = 5
+    text = registry.render()
+    assert "# TYPE cache_hits_total counter" in text
+    assert 'cache_hits_total{cache="export"} 5' in text
+
+
+def error_count(kind: str) -> float:
+    return ERRORS._values.get(("http", kind), 0.0)
+
+
+def call(app):
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": []}
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        pass
+
+    return MetricsMiddleware(app)(scope, receive, send)
+
+
+def test_unhandled_exception_is_counted_once():
+    class Boom(Exception):
+        pass
+
+    async def app(scope, receive, send):
+        raise Boom()
+
+    before_type, before_status = error_count("Boom"), error_count("500")
+    with pytest.raises(Boom):
+        run(call(app))
+    assert error_count("Boom") == before_type + 1
+    assert error_count("500") == before_status
+
+
+def test_server_error_response_is_counted_by_status():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 503, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    before = error_count("503")
+    run(call(app))
+    assert error_count("503") == before + 1
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.main import resolve_refinement_context, session_store
+from app.api.models.document import RefinementRequest
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def refinement(**fields) -> RefinementRequest:
+    return RefinementRequest(refinement_prompt="shorter", doc_type="Announcement", tone="Neutral", **fields)
+
+
+def test_session_without_version_refines_the_latest_version():
+    async def scenario():
+        session_id = await session_store.create_session()
+        await session_store.add_version(session_id, "first", {})
+        await session_store.add_version(session_id, "second", {})
+        document, history = await resolve_refinement_context(refinement(session_id=session_id))
+        assert (document, history) == ("second", ["first"])
+
+    run(scenario())
+
+
+def test_fresh_session_with_inline_document_keeps_the_inline_history():
+    async def scenario():
+        session_id = await session_store.create_session()
+        request = refinement(session_id=session_id, current_document="v4", history=["v1", "v2", "v3", "v4"])
+        document, history = await resolve_refinement_context(request)
+        assert document == "v4"
+        assert history == ["v2", "v3", "v4"][-session_store.history_window:]
+        # The inline document seeds the session for later turns
+        assert (await session_store.get_version(session_id))["document"] == "v4"
+
+    run(scenario())
+
+
+def test_unknown_session_is_not_found():
+    with pytest.raises(HTTPException) as error:
+        run(resolve_refinement_context(refinement(session_id="missing")))
+    assert error.value.status_code == 404
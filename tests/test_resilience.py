@@ -0,0 +1,222 @@
+import asyncio
+import time
+
+import pytest
+
+from app.api.services.resilience import (
+    CircuitBreaker, CircuitOpenError, ResilientCaller, UpstreamError, UpstreamTimeout, is_retryable
+)
+
+
+class ServiceUnavailable(Exception):
+    """Named like the google.api_core error, so it is classified as transient."""
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def caller(**kwargs) -> ResilientCaller:
+    options = {"attempt_timeout": 1.0, "first_chunk_timeout": 1.0, "stream_idle_timeout": 1.0, "backoff": 0.0}
+    options.update(kwargs)
+    return ResilientCaller(**options)
+
+
+def flaky(failures, result="ok", error=ServiceUnavailable):
+    """A request factory that fails ``failures`` times, then returns ``result``."""
+    calls = []
+
+    async def request():
+        calls.append(time.perf_counter())
+        if len(calls) <= failures:
+            raise error("boom")
+        return result
+
+    return request, calls
+
+
+def test_transient_errors_are_classified_as_retryable():
+    assert is_retryable(ServiceUnavailable())
+    assert is_retryable(asyncio.TimeoutError())
+    assert is_retryable(ConnectionError())
+    assert not is_retryable(ValueError())
+
+
+def test_transient_failures_are_retried():
+    request, calls = flaky(2)
+    assert run(caller(retries=2).call(request)) == "ok"
+    assert len(calls) == 3
+
+
+def test_exhausted_retries_raise_upstream_error():
+    request, calls = flaky(10)
+    with pytest.raises(UpstreamError) as raised:
+        run(caller(retries=2).call(request))
+    assert raised.value.status_code == 503
+    assert len(calls) == 3
+
+
+def test_non_retryable_errors_propagate_without_retry():
+    request, calls = flaky(1, error=ValueError)
+    resilient = caller(retries=2)
+    with pytest.raises(ValueError):
+        run(resilient.call(request))
+    assert len(calls) == 1
+    assert resilient.breaker.state == "closed"
+
+
+def test_slow_attempts_time_out_with_504():
+    async def request():
+        await asyncio.sleep(1)
+
+    with pytest.raises(UpstreamTimeout) as raised:
+        run(caller(attempt_timeout=0.02, retries=1).call(request))
+    assert raised.value.status_code == 504
+
+
+def test_deadline_bounds_the_whole_call():
+    async def request():
+        await asyncio.sleep(1)
+
+    start = time.perf_counter()
+    with pytest.raises(UpstreamTimeout):
+        run(caller(attempt_timeout=0.05, deadline=0.12, retries=10).call(request))
+    assert time.perf_counter() - start < 0.5
+
+
+def test_breaker_opens_after_consecutive_failures_and_fails_fast():
+    resilient = caller(retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    request, calls = flaky(10)
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            run(resilient.call(request))
+    assert resilient.breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as raised:
+        run(resilient.call(request))
+    assert len(calls) == 2
+    assert 0 < raised.value.retry_after <= 60
+
+
+def test_half_open_breaker_closes_on_success_and_reopens_on_failure():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    resilient = caller(retries=0, breaker=breaker)
+    request, _ = flaky(1)
+    with pytest.raises(UpstreamError):
+        run(resilient.call(request))
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert run(resilient.call(request)) == "ok"
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_hedged_attempt_wins_and_the_slow_one_is_cancelled():
+    cancelled = []
+    calls = []
+
+    async def request():
+        calls.append(1)
+        if len(calls) == 1:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return "primary"
+        return "hedge"
+
+    start = time.perf_counter()
+    assert run(caller(hedge=True, hedge_after=0.02).call(request)) == "hedge"
+    assert time.perf_counter() - start < 0.5
+    assert cancelled == [True]
+
+
+def test_hedging_is_off_by_default():
+    calls = []
+
+    async def request():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    assert run(caller().call(request)) == "ok"
+    assert len(calls) == 1
+
+
+class Stream:
+    """An async chunk iterator that records whether it was closed."""
+
+    def __init__(self, chunks, delay=0.0, first_delay=0.0):
+        self.chunks = list(chunks)
+        self.delay = delay
+        self.first_delay = first_delay
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(self.first_delay if self.sent == 0 else self.delay)
+        if self.sent == len(self.chunks):
+            raise StopAsyncIteration
+        self.sent += 1
+        return self.chunks[self.sent - 1]
+
+    async def aclose(self):
+        self.closed = True
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_stream_retries_until_the_first_chunk_then_yields_everything():
+    streams = []
+
+    async def request():
+        if not streams:
+            streams.append(None)
+            raise ServiceUnavailable("boom")
+        streams.append(Stream(["a", "b", "c"]))
+        return streams[-1]
+
+    assert run(collect(caller(retries=1).stream(request))) == ["a", "b", "c"]
+    assert streams[-1].closed
+
+
+def test_stalled_stream_raises_upstream_timeout():
+    async def request():
+        return Stream(["a", "b"], delay=1.0)
+
+    async def scenario():
+        received = []
+        with pytest.raises(UpstreamTimeout):
+            async for chunk in caller(stream_idle_timeout=0.05).stream(request):
+                received.append(chunk)
+        return received
+
+    assert run(scenario()) == ["a"]
+
+
+def test_losing_hedged_stream_is_closed():
+    streams = []
+
+    async def request():
+        stream = Stream(["x"], first_delay=1.0 if not streams else 0.0)
+        streams.append(stream)
+        return stream
+
+    async def scenario():
+        return await collect(caller(hedge=True, hedge_after=0.02).stream(request))
+
+    assert run(scenario()) == ["x"]
+    assert len(streams) == 2
+    # The slow primary never produced a chunk and must not leak its connection
+    assert streams[0].closed
+    assert streams[1].closed
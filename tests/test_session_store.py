@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+
+from app.api.services.cache_service import MemoryCache, SQLiteCache
+from app.api.services.session_store import SessionStore
+
+WORKERS = 6
+VERSIONS_PER_WORKER = 25
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_versions_are_appended_and_windowed():
+    async def scenario():
+        store = SessionStore(MemoryCache(), history_window=2, max_versions=3)
+        session_id = await store.create_session()
+        ids = [(await store.add_version(session_id, f"v{i}", {}))["version_id"] for i in range(4)]
+        session = await store.get_session(session_id)
+        # Only the newest max_versions are kept
+        assert [v["version_id"] for v in session["versions"]] == ids[1:]
+        assert (await store.get_version(session_id))["document"] == "v3"
+        assert (await store.get_version(session_id, ids[2]))["document"] == "v2"
+        assert await store.get_version(session_id, ids[0]) is None
+        assert await store.get_history(session_id) == ["v2", "v3"]
+        assert await store.get_history(session_id, ids[2]) == ["v1"]
+
+    run(scenario())
+
+
+def test_unknown_sessions_are_not_created_by_appends():
+    async def scenario():
+        store = SessionStore(MemoryCache())
+        assert await store.add_version("missing", "text", {}) is None
+        assert await store.get_session("missing") is None
+        assert await store.get_history("missing") == []
+
+    run(scenario())
+
+
+def test_sqlite_calls_do_not_block_the_event_loop(tmp_path):
+    backend = SQLiteCache(str(tmp_path / "state.sqlite3"), table="sessions")
+    store = SessionStore(backend)
+
+    async def scenario():
+        session_id = await store.create_session()
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        # Hold the connection lock, as a write waiting on another worker would
+        backend._lock.acquire()
+        threading.Timer(0.2, backend._lock.release).start()
+        started = time.perf_counter()
+        assert await store.add_version(session_id, "text", {}) is not None
+        assert time.perf_counter() - started >= 0.2
+        ticker.cancel()
+        assert ticks >= 10
+
+    run(scenario())
+
+
+def append_versions(path: str, session_id: str) -> None:
+    store = SessionStore(SQLiteCache(path, table="sessions"), max_versions=WORKERS * VERSIONS_PER_WORKER)
+
+    async def append():
+        for index in range(VERSIONS_PER_WORKER):
+            await store.add_version(session_id, f"version {index}", {})
+
+    run(append())
+
+
+def test_concurrent_appends_from_several_processes_are_all_kept(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    store = SessionStore(SQLiteCache(path, table="sessions"))
+    session_id = run(store.create_session())
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=append_versions, args=(path, session_id)) for _ in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+    session = run(store.get_session(session_id))
+    assert len(session["versions"]) == WORKERS * VERSIONS_PER_WORKER